@@ -35,6 +35,20 @@ class Settings(BaseSettings):
     ENVIRONMENT: str
     PORT: int 
     API_BASE_URL: str 
+    LOG_LEVEL: str = "INFO"
+
+    # Database connection pool
+    DB_POOL_MIN_SIZE: int = 5
+    DB_POOL_MAX_SIZE: int = 20
+    DB_STATEMENT_CACHE_SIZE: int = 1024
+
+    # Pooled SMTP sessions for outgoing email
+    SMTP_POOL_SIZE: int = 5
+    # Threads for email render/serialize work
+    EMAIL_WORKER_THREADS: int = 8
+
+    # Directory for compiled email template bytecode (defaults to a temp dir)
+    JINJA_BYTECODE_CACHE_DIR: str = ""
 
     # File Storage
     # UPLOAD_DIR: str = "uploads"
@@ -50,6 +64,7 @@ class Settings(BaseSettings):
     # SendGrid Configuration
     SENDGRID_API_KEY: str
     SENDGRID_FROM_EMAIL: str 
+    SENDGRID_MAX_RPS: float = 50
     EMAIL_PROVIDER: str
 
     # Template IDs (you'll get these from SendGrid dashboard)
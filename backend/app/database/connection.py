@@ -12,15 +12,26 @@ from pgvector.asyncpg import register_vector
 import uuid
 import decimal
 from datetime import date, datetime, time, timedelta
+from app.utils.cache_utils import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Embedding status is polled by the frontend every 1-2s; serve repeats from memory
+EMBEDDING_STATUS_CACHE_TTL = 2.0
+EMBEDDING_STATUS_CACHE_MAX_SIZE = 1024
+
+# Chart statistics only move when a chart is stored or deleted
+CHART_STATS_CACHE_TTL = 30.0
+CHART_STATS_CACHE_MAX_SIZE = 256
+
 class Database:
     """Database connection manager with connection pool"""
     
     def __init__(self):
         # self.connection: Optional[asyncpg.Connection] = None
         self.pool: Optional[asyncpg.Pool] = None
+        self._embedding_status_cache = TTLCache(EMBEDDING_STATUS_CACHE_TTL, EMBEDDING_STATUS_CACHE_MAX_SIZE)  # (project_id, user_id) -> status
+        self._chart_stats_cache = TTLCache(CHART_STATS_CACHE_TTL, CHART_STATS_CACHE_MAX_SIZE)  # (user_id, project_id) -> stats
 
     async def connect(self):
         """Establish database connection"""
@@ -34,8 +45,12 @@ class Database:
 
             self.pool = await asyncpg.create_pool(
                 settings.DATABASE_URL,
-                min_size=1,
-                max_size=10,
+                min_size=settings.DB_POOL_MIN_SIZE,
+                max_size=settings.DB_POOL_MAX_SIZE,
+                max_inactive_connection_lifetime=300,
+                max_queries=50000,
+                statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+                max_cached_statement_lifetime=0,
                 command_timeout=60,
                 server_settings={
                     'jit': 'off'
@@ -65,6 +80,21 @@ class Database:
             await self.pool.close()
             logger.info("Database connection pool closed")
 
+    def get_pool_stats(self) -> Dict[str, int]:
+        """Get connection pool usage for health checks"""
+        if not self.pool:
+            return {}
+        
+        size = self.pool.get_size()
+        idle = self.pool.get_idle_size()
+        return {
+            "min_size": self.pool.get_min_size(),
+            "max_size": self.pool.get_max_size(),
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle
+        }
+
     async def ensure_schema_ready(self):
         """Ultra-fast schema setup with minimal database roundtrips"""
         try:
@@ -101,6 +131,7 @@ class Database:
                     'idx_metadata_embeddings_document_id', 'idx_metadata_embeddings_project_id', 'idx_metadata_embeddings_user_id',
                     'idx_business_logic_embeddings_document_id', 'idx_business_logic_embeddings_project_id', 'idx_business_logic_embeddings_user_id',
                     'idx_reference_embeddings_document_id', 'idx_reference_embeddings_project_id', 'idx_reference_embeddings_user_id',
+                    'idx_metadata_embeddings_project_user', 'idx_business_logic_embeddings_project_user', 'idx_reference_embeddings_project_user',
                     'idx_metadata_embeddings_hnsw', 'idx_business_logic_embeddings_hnsw', 'idx_reference_embeddings_hnsw',
                     'idx_po_workflow_status', 
                     #'idx_notifications_user',
@@ -364,6 +395,9 @@ class Database:
             'idx_reference_embeddings_document_id': "CREATE INDEX IF NOT EXISTS idx_reference_embeddings_document_id ON reference_embeddings(document_id);",
             'idx_reference_embeddings_project_id': "CREATE INDEX IF NOT EXISTS  idx_reference_embeddings_project_id ON reference_embeddings(project_id);",
             'idx_reference_embeddings_user_id': "CREATE INDEX IF NOT EXISTS  idx_reference_embeddings_user_id ON reference_embeddings(user_id);",
+            'idx_metadata_embeddings_project_user': "CREATE INDEX IF NOT EXISTS idx_metadata_embeddings_project_user ON metadata_embeddings(project_id, user_id);",
+            'idx_business_logic_embeddings_project_user': "CREATE INDEX IF NOT EXISTS idx_business_logic_embeddings_project_user ON business_logic_embeddings(project_id, user_id);",
+            'idx_reference_embeddings_project_user': "CREATE INDEX IF NOT EXISTS idx_reference_embeddings_project_user ON reference_embeddings(project_id, user_id);",
             'idx_metadata_embeddings_hnsw': "CREATE INDEX IF NOT EXISTS  idx_metadata_embeddings_hnsw ON metadata_embeddings USING hnsw(embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);",
             'idx_business_logic_embeddings_hnsw': "CREATE INDEX IF NOT EXISTS  idx_business_logic_embeddings_hnsw ON business_logic_embeddings USING hnsw(embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);",
             'idx_reference_embeddings_hnsw': "CREATE INDEX IF NOT EXISTS  idx_reference_embeddings_hnsw ON reference_embeddings USING hnsw(embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);",
@@ -521,7 +555,7 @@ class Database:
         try:
             async with self.pool.acquire() as connection:
                 # Set user context for RLS
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 row = await connection.fetchrow(query, user_id, name, description)
                 return dict(row)
         except Exception as e:
@@ -543,7 +577,7 @@ class Database:
         try:
             async with self.pool.acquire() as connection:
                 # Set user context for RLS
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 rows = await connection.fetch(query, user_id)
                 return [dict(row) for row in rows]
         except Exception as e:
@@ -564,7 +598,7 @@ class Database:
         try:
             async with self.pool.acquire() as connection:
                 # Set user context for RLS
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 row = await connection.fetchrow(query, project_id, user_id)
                 if row:
                     return dict(row)
@@ -581,7 +615,7 @@ class Database:
         try:
             async with self.pool.acquire() as connection:
                 # Set user context for RLS
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 
                 # Start transaction for atomic operation
                 async with connection.transaction():
@@ -626,7 +660,7 @@ class Database:
         try:
             async with self.pool.acquire() as connection:
                 # Set user context for RLS
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 row = await connection.fetchrow(query, user_id, project_name)
                 if row:
                     return dict(row)
@@ -668,11 +702,12 @@ class Database:
         
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 row = await connection.fetchrow(
                     query, id, project_id, user_id, name, original_filename,
                     file_path, bucket_name, file_size, mime_type, document_type
                 )
+                self._embedding_status_cache.pop((project_id, user_id), None)
                 return dict(row)
         except Exception as e:
             logger.error(f"Failed to create document: {e}")
@@ -694,7 +729,7 @@ class Database:
         
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 rows = await connection.fetch(query, project_id, user_id)
                 return [dict(row) for row in rows]
         except Exception as e:
@@ -715,7 +750,7 @@ class Database:
         
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 rows = await connection.fetch(query, project_id, user_id)
                 
                 # Convert to dictionary
@@ -728,40 +763,61 @@ class Database:
         except Exception as e:
             logger.error(f"Failed to get document counts: {e}")
             return {}
+
+    async def delete_document(self, document_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """Delete a document and return its storage location, or None if not found"""
+        if not self.pool:
+            raise Exception("Database pool not initialized")
+            
+        query = """
+        DELETE FROM documents
+        WHERE id = $1 AND user_id = $2
+        RETURNING project_id::text, file_path, bucket_name
+        """
+        
+        try:
+            async with self.pool.acquire() as connection:
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
+                row = await connection.fetchrow(query, document_id, user_id)
+                if row:
+                    self._embedding_status_cache.pop((row['project_id'], user_id), None)
+                    return dict(row)
+                return None
+        except Exception as e:
+            logger.error(f"Failed to delete document: {e}")
+            raise
+
     # Add to Database class
     async def get_project_embedding_status(self, project_id: str, user_id: int) -> Dict[str, Any]:
         """Get embedding processing status for a project"""
         if not self.pool:
             raise Exception("Database pool not initialized")
         
+        cache_key = (project_id, user_id)
+        cached = self._embedding_status_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
         query = """
         SELECT 
-            document_type,
-            embedding_status,
-            COUNT(*) as count
+            COUNT(*) as total,
+            COUNT(*) FILTER (WHERE embedding_status = 'processing') as processing,
+            COUNT(*) FILTER (WHERE embedding_status = 'completed') as completed,
+            COUNT(*) FILTER (WHERE embedding_status = 'failed') as failed,
+            COUNT(*) FILTER (WHERE embedding_status = 'pending') as pending
         FROM documents 
-        WHERE project_id = $1 AND user_id = $2 
-        GROUP BY document_type, embedding_status
+        WHERE project_id = $1 AND user_id = $2
         """
         
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
-                rows = await connection.fetch(query, project_id, user_id)
-                
-                status = {
-                    'total': 0,
-                    'processing': 0,
-                    'completed': 0,
-                    'failed': 0,
-                    'pending': 0
-                }
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
+                row = await connection.fetchrow(query, project_id, user_id)
+                status = dict(row)
                 
-                for row in rows:
-                    status['total'] += row['count']
-                    status[row['embedding_status']] += row['count']
+                self._embedding_status_cache.set(cache_key, status)
                 
-                return status
+                return dict(status)
         except Exception as e:
             logger.error(f"Error getting embedding status: {e}")
             return {'total': 0, 'processing': 0, 'completed': 0, 'failed': 0, 'pending': 0}
@@ -781,7 +837,7 @@ class Database:
 
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 row = await connection.fetchrow(query, user_id, project_id, title)
                 return dict(row)
         except Exception as e:
@@ -822,7 +878,7 @@ class Database:
 
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 rows = await connection.fetch(query, *params)
                 return [dict(row) for row in rows]
         except Exception as e:
@@ -917,7 +973,7 @@ class Database:
 
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 row = await connection.fetchrow(
                     query, conversation_id, user_id, project_id, role, content,
                     sql_query, safe_json_dumps(query_result) if query_result else None,
@@ -950,7 +1006,7 @@ class Database:
 
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 rows = await connection.fetch(query, conversation_id, user_id)
                 return [dict(row) for row in rows]
         except Exception as e:
@@ -1033,7 +1089,7 @@ class Database:
         
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {po_data['user_id']}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(po_data['user_id']))
                 row = await connection.fetchrow(
                     query, 
                     po_data['po_number'], po_data['workflow_id'], po_data['project_id'],
@@ -1115,7 +1171,7 @@ class Database:
         
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 rows = await connection.fetch(query, user_id, project_id, self._convert_date_for_db(order_date))
                 return [dict(row) for row in rows]
         except Exception as e:
@@ -1134,7 +1190,7 @@ class Database:
         
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 rows = await connection.fetch(query, user_id, project_id)
                 return [dict(row) for row in rows]
         except Exception as e:
@@ -1161,7 +1217,7 @@ class Database:
         """Get detailed PO information with line items"""
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 
                 po_details = await connection.fetchrow("""
                     SELECT po.po_number, po.vendor_name, po.vendor_email, po.total_amount, 
@@ -1195,7 +1251,7 @@ class Database:
         """Get POs generated by a specific workflow"""
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 
                 pos = await connection.fetch("""
                     SELECT po_number, vendor_name, total_amount, status, needs_approval,
@@ -1305,7 +1361,7 @@ class Database:
         """Update approval request status"""
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 query = """
                 UPDATE po_approval_requests 
                 SET status = $1, comment = $2, updated_at = CURRENT_TIMESTAMP
@@ -1416,6 +1472,7 @@ class Database:
                     json.dumps(chart.get('columns_used', {})),
                     json.dumps({'data_points': chart.get('data_points', 0)})
                 )
+            self._invalidate_chart_stats(user_id)
             
             logger.info(f"Stored chart {chart['chart_id']} in history")
         except Exception as e:
@@ -1440,7 +1497,7 @@ class Database:
             """
             
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 rows = await connection.fetch(query, conversation_id, user_id)
                 
                 return [dict(row) for row in rows]
@@ -1455,22 +1512,23 @@ class Database:
         chart_ids: List[str],
         user_id: int
     ) -> List[Dict[str, Any]]:
-        """Get specific charts by IDs"""
+        """Get specific charts by IDs, shaped for PDF generation (PNG decoded to bytes)"""
         
         if not self.pool:
             raise Exception("Database pool not initialized")
         
         try:
             query = """
-                SELECT chart_id, chart_type, title, chart_png_base64, 
-                    data_summary, created_at
+                SELECT chart_id, chart_type, title,
+                    decode(chart_png_base64, 'base64') AS chart_png,
+                    COALESCE((data_summary->>'data_points')::int, 0) AS data_points
                 FROM chart_history
                 WHERE chart_id = ANY($1) AND user_id = $2
                 ORDER BY created_at DESC
             """
             
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 rows = await connection.fetch(query, chart_ids, user_id)
                 
                 return [dict(row) for row in rows]
@@ -1498,9 +1556,11 @@ class Database:
             """
             
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 result = await connection.fetchval(query, chart_id, user_id)
                 
+                if result is not None:
+                    self._invalidate_chart_stats(user_id)
                 return result is not None
         
         except Exception as e:
@@ -1527,7 +1587,7 @@ class Database:
             """
             
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 row = await connection.fetchrow(query, chart_id, user_id)
                 
                 return dict(row) if row else None
@@ -1537,6 +1597,10 @@ class Database:
             raise
 
 
+    def _invalidate_chart_stats(self, user_id: int):
+        """Drop cached chart statistics for a user, across all projects (and the all-projects entry)"""
+        self._chart_stats_cache.pop_matching(lambda cache_key: cache_key[0] == user_id)
+
     async def get_user_chart_statistics(
         self,
         user_id: int,
@@ -1547,6 +1611,11 @@ class Database:
         if not self.pool:
             raise Exception("Database pool not initialized")
         
+        cache_key = (user_id, project_id)
+        cached = self._chart_stats_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
         try:
             if project_id:
                 query = """
@@ -1577,15 +1646,19 @@ class Database:
                 params = [user_id]
             
             async with self.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 row = await connection.fetchrow(query, *params)
                 
-                return {
+                stats = {
                     "total_charts": row['total_charts'] or 0,
                     "unique_types": row['unique_types'] or 0,
                     "conversations_with_charts": row['conversations_with_charts'] or 0,
                     "last_chart_generated": row['last_chart_generated'].isoformat() if row['last_chart_generated'] else None
                 }
+                
+                self._chart_stats_cache.set(cache_key, stats)
+                
+                return dict(stats)
         
         except Exception as e:
             logger.error(f"Error fetching chart statistics: {e}")
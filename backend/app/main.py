@@ -6,6 +6,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.routes.auth_routes import router as auth_router
 from app.database.connection import db
+from app.services.email_service import email_service
 from app.config.settings import settings
 from app.routes.project_routes import router as projects_router
 from app.routes.sql_routes import router as sql_chat_router
@@ -17,8 +18,8 @@ from app.routes.visualization_routes import router as visualization_router
 
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (set LOG_LEVEL=WARNING in production to skip info chatter)
+logging.basicConfig(level=settings.LOG_LEVEL.upper())
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
@@ -35,6 +36,7 @@ async def lifespan(app: FastAPI):
         raise
     finally:
         # Shutdown
+        await email_service.close()
         await db.disconnect()
         logger.info("Application shutdown completed")
 
@@ -78,12 +80,13 @@ async def health_check():
     """Health check endpoint"""
     try:
         # Basic database connectivity check
-        if db.connection is None:
+        if db.pool is None:
             raise HTTPException(status_code=503, detail="Database not connected")
         
         return {
             "status": "healthy",
             "database": "connected",
+            "pool": db.get_pool_stats(),
             "environment": settings.ENVIRONMENT
         }
     except Exception as e:
@@ -17,6 +17,10 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/documents", tags=["documents"])
 security = HTTPBearer()
 
+# Allowed document types - checked in the handler so errors keep the {"success", "error"} shape
+DOCUMENT_TYPES = ('metadata', 'businesslogic', 'references')
+VALID_DOCUMENT_TYPES = frozenset(DOCUMENT_TYPES)
+
 class DocumentResponse(BaseModel):
     id: str
     name: str
@@ -62,11 +66,10 @@ async def upload_documents(
             )
         
         # Validate document type
-        valid_types = ['metadata', 'businesslogic', 'references']
-        if document_type not in valid_types:
+        if document_type not in VALID_DOCUMENT_TYPES:
             return JSONResponse(
                 status_code=400,
-                content={"success": False, "error": f"Invalid document type. Must be one of: {valid_types}"}
+                content={"success": False, "error": f"Invalid document type. Must be one of: {list(DOCUMENT_TYPES)}"}
             )
         
         # Validate files
@@ -90,16 +93,19 @@ async def upload_documents(
         successful_uploads = []
         failed_uploads = []
         errors = []
+        processing_batch = []
+
+        # Pre-generate document IDs for the whole batch
+        document_ids = [str(uuid.uuid4()) for _ in files]
         
-        for file in files:
+        for file, document_id in zip(files, document_ids):
             try:
-                logger.info(f"Processing file: {file.filename}, size: {file.size}, type: {file.content_type}")
+                logger.info("Processing file: %s, size: %s, type: %s", file.filename, file.size, file.content_type)
                 
                 # Upload file to storage
                 storage_result = await storage_service.upload_file(file, user["id"], project_id, document_type)
                 
                 # Create document record
-                document_id = str(uuid.uuid4())
                 document = await db.create_document(
                     id=document_id,
                     project_id=project_id,
@@ -115,24 +121,30 @@ async def upload_documents(
                 
                 successful_uploads.append(DocumentResponse(**document))
                 
-                # Process document in background
-                background_tasks.add_task(
-                    document_processor.process_document,
-                    document_id,
-                    storage_result["file_path"],
-                    document_type,
-                    storage_result["bucket_name"]
-                )
+                # Queue for background processing
+                processing_batch.append({
+                    "document_id": document_id,
+                    "file_path": storage_result["file_path"],
+                    "document_type": document_type,
+                    "bucket_name": storage_result["bucket_name"]
+                })
                 
-                logger.info(f"Successfully uploaded: {file.filename}")
+                logger.info("Successfully uploaded: %s", file.filename)
                 
             except Exception as e:
-                logger.error(f"Failed to upload file {file.filename}: {str(e)}")
+                logger.error("Failed to upload file %s: %s", file.filename, e)
                 errors.append({
                     "filename": file.filename,
                     "error": str(e)
                 })
                 failed_uploads.append(file.filename)
+
+        # Process all uploaded documents in a single background task
+        if processing_batch:
+            background_tasks.add_task(
+                document_processor.process_documents_batch,
+                processing_batch
+            )
         
         # Always return JSON with consistent structure
         response_data = BatchUploadResponse(
@@ -158,19 +170,19 @@ async def upload_documents(
             return response_data
         
     except HTTPException as he:
-        logger.error(f"HTTP error in upload: {he.detail}")
+        logger.error("HTTP error in upload: %s", he.detail)
         return JSONResponse(
             status_code=he.status_code,
             content={"success": False, "error": he.detail}
         )
     except Exception as e:
-        logger.error(f"Unexpected upload error: {str(e)}")
+        logger.error("Unexpected upload error: %s", e)
         return JSONResponse(
             status_code=500,
             content={"success": False, "error": "Internal server error"}
         )
 
-@router.get("/project/{project_id}")
+@router.get("/project/{project_id}", response_model=None)
 async def get_project_documents(
     project_id: str,
     credentials: HTTPAuthorizationCredentials = Depends(security)
@@ -206,19 +218,21 @@ async def get_project_documents(
     # Get document counts by type
         counts = await db.get_project_document_counts_by_type(project_id, user["id"])
         
-        return {
+        # Rows are already JSON-safe (ids and timestamps cast to text in SQL),
+        # so return them as-is without re-validating through DocumentResponse
+        return JSONResponse(content={
             "success": True,
-            "documents": [DocumentResponse(**doc) for doc in documents],
+            "documents": documents,
             "counts": {
                 "metadata": counts.get("metadata", 0),
                 "businesslogic": counts.get("businesslogic", 0), 
                 "references": counts.get("references", 0),
                 "total": sum(counts.values())
             }
-        }
+        })
         
     except Exception as e:
-        logger.error(f"Get documents error: {str(e)}")
+        logger.error("Get documents error: %s", e)
         return JSONResponse(
             status_code=500,
             content={"success": False, "error": "Internal server error"}
@@ -264,7 +278,7 @@ async def get_document(
             content={"success": False, "error": he.detail}
         )
     except Exception as e:
-        logger.error(f"Get document error: {str(e)}")
+        logger.error("Get document error: %s", e)
         return JSONResponse(
             status_code=500,
             content={"success": False, "error": "Internal server error"}
@@ -285,8 +299,8 @@ async def delete_document(
                 content={"success": False, "error": "Invalid authentication"}
             )
         
-        # Get document first to verify ownership
-        document = await db.get_document_by_id(document_id, user["id"])
+        # Delete from database, scoped to the user, returning the storage location
+        document = await db.delete_document(document_id, user["id"])
         if not document:
             return JSONResponse(
                 status_code=404,
@@ -294,10 +308,10 @@ async def delete_document(
             )
         
         # Delete from storage
-        await storage_service.delete_file(document["file_path"], document["bucket_name"])
-        
-        # Delete from database (you'll need to implement this)
-        await db.delete_document(document_id, user["id"])
+        await storage_service.delete_file(
+            bucket_name=document["bucket_name"],
+            file_path=document["file_path"]
+        )
         
         return {"success": True, "message": "Document deleted successfully"}
         
@@ -307,7 +321,7 @@ async def delete_document(
             content={"success": False, "error": he.detail}
         )
     except Exception as e:
-        logger.error(f"Delete document error: {str(e)}")
+        logger.error("Delete document error: %s", e)
         return JSONResponse(
             status_code=500,
             content={"success": False, "error": "Internal server error"}
@@ -341,7 +355,7 @@ async def get_embedding_status(
         }
         
     except Exception as e:
-        logger.error(f"Error getting embedding status: {e}")
+        logger.error("Error getting embedding status: %s", e)
         return JSONResponse(
             status_code=500,
             content={"success": False, "error": "Internal server error"}
@@ -764,7 +764,7 @@ async def process_rejection_form(
             """
         
     except Exception as e:
-        logger.error(f"Error processing rejection: {e}")
+        logger.error("Error processing rejection: %s", e)
         return "<html><body style='text-align: center; padding: 50px;'><h1>Error</h1><p>System error occurred.</p></body></html>"
 
 # LEGACY AUTHENTICATED ROUTES (Keep for backward compatibility if needed)
@@ -810,7 +810,7 @@ async def approve_purchase_order_legacy(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Legacy PO approval error: {e}")
+        logger.error("Legacy PO approval error: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.post("/reject/{po_number}", response_model=dict)
@@ -854,5 +854,5 @@ async def reject_purchase_order_legacy(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Legacy PO rejection error: {e}")
+        logger.error("Legacy PO rejection error: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
@@ -2,18 +2,16 @@
 Chart generation routes
 """
 from fastapi import APIRouter, HTTPException, Depends, Response, Request
-from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse
+from fastapi.responses import HTMLResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, ValidationError, validator
 from typing import List, Dict, Any, Optional
 from app.utils.auth_utils import get_current_user
 from app.services.visualization_service import chart_service
 from app.database.connection import db
 import logging
-import tempfile
-import json
-from io import BytesIO
+import orjson
 
 logger = logging.getLogger(__name__)
 
@@ -44,36 +42,39 @@ async def debug_validate(request: Request):
     """Debug endpoint - validate request without processing"""
     try:
         body = await request.body()
-        text = body.decode('utf-8')
-        logger.info(f"Raw body: {text}")
+        logger.info(f"Raw body: {body.decode('utf-8', errors='replace')}")
         
-        parsed = json.loads(text)
-        logger.info(f"Parsed JSON: {parsed}")
-        
-        # Try to validate with Pydantic
+        # Parse and validate in a single pass with Pydantic
         try:
-            validated = MultiChartPDFRequest(**parsed)
+            validated = MultiChartPDFRequest.model_validate_json(body)
             return {
                 "success": True,
-                "validated": validated.dict(),
+                "validated": validated.model_dump(),
                 "message": "Request is valid ✅"
             }
-        except Exception as e:
+        except ValidationError as e:
             logger.error(f"Validation error: {e}")
             return {
                 "success": False,
                 "error": str(e),
-                "parsed": parsed,
+                "raw_body": body.decode('utf-8', errors='replace'),
                 "message": "Validation failed ❌"
             }
     except Exception as e:
         logger.error(f"Debug error: {e}")
         return {"error": str(e)}
     
+# CHART_TYPES is static for the life of the process - serialize it once
+CHART_TYPES_BODY = orjson.dumps({"chart_types": chart_service.CHART_TYPES})
+
 @router.get("/types")
 async def get_chart_types():
     """Get available chart types"""
-    return {"chart_types": chart_service.CHART_TYPES}
+    return Response(
+        content=CHART_TYPES_BODY,
+        media_type="application/json",
+        headers={"Cache-Control": "public, max-age=3600"}
+    )
     
 @router.post("/generate-pdf")
 async def generate_multi_chart_pdf(
@@ -116,26 +117,8 @@ async def generate_multi_chart_pdf(
         
         logger.info(f"✅ Found {len(charts_data)} charts in database")
 
-        # Convert to list of dicts
-        charts = []
-        for row in charts_data:
-            data_summary = row.get('data_summary', {})
-            if isinstance(data_summary, str):
-                import json
-                try:
-                    data_summary = json.loads(data_summary)
-                except:
-                    logger.warning(f"Failed to parse data_summary: {e}")
-                    data_summary = {}
-            charts.append({
-                'success': True,
-                'chart_id': row['chart_id'],
-                'chart_type': row['chart_type'],
-                'title': row['title'],
-                'chart_png_base64': row['chart_png_base64'],
-                'chart_html': row.get('chart_html'),
-                'data_points': data_summary.get('data_points',0)
-            })
+        # Rows are already shaped by the query - no per-row JSON parsing
+        charts = [{'success': True, **row} for row in charts_data]
         
         # Generate PDF
         logger.info("🔄 Generating PDF...")
@@ -145,9 +128,9 @@ async def generate_multi_chart_pdf(
             user_name=user.get("full_name", "User")
         )
         logger.info(f"✅ PDF generated successfully ({len(pdf_bytes)} bytes)")
-        # Return as downloadable file
-        return StreamingResponse(
-            BytesIO(pdf_bytes),
+        # Return as downloadable file - bytes are already in memory, send them as-is
+        return Response(
+            content=pdf_bytes,
             media_type="application/pdf",
             headers={
                 "Content-Disposition": f"attachment; filename={request.report_title.replace(' ', '_')}.pdf"
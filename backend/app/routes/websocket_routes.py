@@ -4,7 +4,7 @@ WebSocket routes for real-time PO workflow notifications
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
 from app.websocket.connection_manager import manager
 from app.utils.auth_utils import get_current_user
-import json
+import orjson
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,12 +29,12 @@ async def websocket_endpoint(websocket: WebSocket, project_id: str, token: str =
         
         # Send initial connection confirmation
         await manager.send_personal_message(
-            json.dumps({
+            orjson.dumps({
                 "type": "connection_established",
                 "project_id": project_id,
                 "message": "Connected to PO workflow notifications",
                 "user_id": user["id"]
-            }),
+            }).decode(),
             websocket
         )
         
@@ -2,30 +2,61 @@
 Enhanced Document Processor with hash-based deduplication
 """
 import asyncio
+from collections import OrderedDict
 from datetime import datetime
 import os
 import re
+import uuid
 import json
 from typing import List, Dict, Any
 import logging
-from openai import AsyncOpenAI
-import PyPDF2
-import docx
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
 from io import BytesIO
-from docx import Document
 from app.config.settings import settings
 from app.services.storage_service import storage_service
 from app.database.connection import db
 from app.utils.document_parsers import MetadataParser, BusinessLogicParser, ReferenceParser, FileExtractor
+from app.utils.retry_utils import retry_delay
 
 
 logger = logging.getLogger(__name__)
 
+# OpenAI accepts a list of inputs per embeddings request
+EMBEDDING_BATCH_SIZE = 100
+EMBEDDING_MAX_CONCURRENT_BATCHES = 5
+EMBEDDING_CACHE_MAX_SIZE = 4096
+# Transient OpenAI failures worth retrying, with exponential backoff + jitter
+EMBEDDING_MAX_ATTEMPTS = 5
+EMBEDDING_MAX_BACKOFF = 30.0
+RETRYABLE_OPENAI_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+# Constant SQL so asyncpg's per-connection statement cache reuses the prepared plans
+UPDATE_PROCESSING_PROGRESS_SQL = """
+UPDATE documents 
+SET embedding_status = $1, 
+    updated_at = CURRENT_TIMESTAMP,
+    processing_details = $3
+WHERE id = $2
+"""
+GET_DOCUMENT_INFO_SQL = "SELECT user_id, project_id::text FROM documents WHERE id = $1"
+
 class DocumentProcessor:
     def __init__(self):
-        self.openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        # Long-lived HTTP/2 client: concurrent embedding requests share warm TLS connections
+        self.http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            timeout=30
+        )
+        # SDK retries off - the embedding methods below own the retry policy
+        self.openai_client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY, http_client=self.http_client, max_retries=0
+        )
         self.embed_model = settings.EMBED_MODEL
         self.embedding_dimensions = settings.EMBEDDING_DIMENSIONS
+        # LRU of stripped text -> embedding; repeated headers/columns skip the API
+        self._embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
 
         # Initialize parsers
         self.metadata_parser = MetadataParser()
@@ -37,11 +68,13 @@ class DocumentProcessor:
         self.processing_strategies = {
             "metadata": self._create_metadata_embeddings,
             "businesslogic": self._create_business_logic_embeddings,
-            "references": self._create_reference_embeddings
+            "references": self._create_reference_embeddings_batch
         }
 
     # Add progress update method
-    async def _update_processing_progress(self, document_id: str, progress: int, status: str, details: str = ""):
+    async def _update_processing_progress(
+        self, document_id: str, progress: int, status: str, details: str = "", connection=None
+    ):
         """Update processing progress with detailed status"""
         if not db.pool:
             return
@@ -54,17 +87,17 @@ class DocumentProcessor:
                 "stage": self._get_processing_stage(progress)
             }
             
-            async with db.pool.acquire() as connection:
+            if connection is not None:
                 await connection.execute(
-                    """
-                    UPDATE documents 
-                    SET embedding_status = $1, 
-                        updated_at = CURRENT_TIMESTAMP,
-                        processing_details = $3
-                    WHERE id = $2
-                    """,
+                    UPDATE_PROCESSING_PROGRESS_SQL,
                     status, document_id, json.dumps(processing_info)
                 )
+            else:
+                async with db.pool.acquire() as connection:
+                    await connection.execute(
+                        UPDATE_PROCESSING_PROGRESS_SQL,
+                        status, document_id, json.dumps(processing_info)
+                    )
             logger.info(f"Updated document {document_id}: {status} ({progress}%) - {details}")
         except Exception as e:
             logger.error(f"Error updating processing progress for {document_id}: {e}")
@@ -84,18 +117,27 @@ class DocumentProcessor:
     async def process_document(self, document_id: str, file_path: str, document_type: str, bucket_name: str) -> Dict[str, Any]:
         """Process document with bucket-specific logic"""
         try:
+            if not db.pool:
+                raise Exception("Database pool not initialized")
 
-            await self._update_processing_progress(document_id, 10, "processing", "Starting document processing")
+            # Hold a pooled connection only while talking to Postgres - the
+            # storage download and text extraction run without one
+            async with db.pool.acquire() as connection:
+                await self._update_processing_progress(
+                    document_id, 10, "processing", "Starting document processing", connection
+                )
 
-            # Get document info including user_id and project_id
-            document_info = await self._get_document_info(document_id)
-            if not document_info:
-                raise Exception("Document not found")
-            
-            user_id = document_info['user_id']
-            project_id = document_info['project_id']
-            
-            await self._update_processing_progress(document_id, 30, "processing", "Extracting text content")
+                # Get document info including user_id and project_id
+                document_info = await self._get_document_info(document_id, connection)
+                if not document_info:
+                    raise Exception("Document not found")
+                
+                user_id = document_info['user_id']
+                project_id = document_info['project_id']
+                
+                await self._update_processing_progress(
+                    document_id, 30, "processing", "Extracting text content", connection
+                )
 
             # Download file from specific bucket
             file_content = await storage_service.download_file(bucket_name, file_path)
@@ -103,17 +145,29 @@ class DocumentProcessor:
             # Extract text
             text_content = await self._extract_text(file_content, file_path)
 
-            await self._update_processing_progress(document_id, 60, "processing", "Creating embeddings")
+            async with db.pool.acquire() as connection:
+                # Session-level setting: this phase commits as it goes, so a
+                # transaction-local one would lapse after the first statement.
+                # Reset before the connection goes back to the pool.
+                await connection.execute("SELECT set_config('app.current_user_id', $1, false)", str(user_id))
+                try:
+                    await self._update_processing_progress(
+                        document_id, 60, "processing", "Creating embeddings", connection
+                    )
 
-            # Use type-specific processing strategy with deduplication
-            if document_type in self.processing_strategies:
-                stats = await self.processing_strategies[document_type](
-                    text_content, document_id, user_id, project_id
-                )
-            else:
-                raise ValueError(f"Unsupported document type: {document_type}")
-            
-            await self._update_processing_progress(document_id, 100, "completed", "Processing complete")
+                    # Use type-specific processing strategy with deduplication
+                    if document_type in self.processing_strategies:
+                        stats = await self.processing_strategies[document_type](
+                            connection, text_content, document_id, user_id, project_id
+                        )
+                    else:
+                        raise ValueError(f"Unsupported document type: {document_type}")
+
+                    await self._update_processing_progress(
+                        document_id, 100, "completed", "Processing complete", connection
+                    )
+                finally:
+                    await connection.execute("RESET app.current_user_id")
             # Update document status
             # await self._update_document_status(document_id, "completed")
             
@@ -134,18 +188,13 @@ class DocumentProcessor:
                 "document_id": document_id
             }
 
-    async def _get_document_info(self, document_id: str) -> Dict[str, Any]:
+    async def _get_document_info(self, document_id: str, connection) -> Dict[str, Any]:
         """Get document info including user_id and project_id"""
-        if not db.pool:
-            raise Exception("Database pool not initialized")
-            
-        query = "SELECT user_id, project_id::text FROM documents WHERE id = $1"
         try:
-            async with db.pool.acquire() as connection:
-                row = await connection.fetchrow(query, document_id)
-                if row:
-                    return dict(row)
-                return None
+            row = await connection.fetchrow(GET_DOCUMENT_INFO_SQL, document_id)
+            if row:
+                return dict(row)
+            return None
         except Exception as e:
             logger.error(f"Failed to get document info: {e}")
             raise
@@ -154,7 +203,9 @@ class DocumentProcessor:
         """Extract text using FileExtractor"""
         return await self.file_extractor.extract_text(file_content, file_path)
     
-    async def _create_metadata_embeddings(self, text: str, document_id: str, user_id: int, project_id: str) -> Dict[str, int]:
+    async def _create_metadata_embeddings(
+        self, connection, text: str, document_id: str, user_id: int, project_id: str
+    ) -> Dict[str, int]:
         """Create hierarchical embeddings for metadata documents with deduplication"""
         # Detect if it's JSON or DOCX format
         if self.metadata_parser.is_json_content(text):
@@ -163,104 +214,193 @@ class DocumentProcessor:
             tables = self.metadata_parser.parse_docx_metadata(text)
 
         # Use the deduplication method from utils
-        async with db.pool.acquire() as connection:
-            await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
-            
-            stats = await self.metadata_parser.create_embeddings_with_dedup(
-                connection, tables, document_id, user_id, project_id, self._get_embedding
-            )
-            
-            logger.info(f"Metadata processing stats for doc {document_id}: {stats}")
-            return stats
+        stats = await self.metadata_parser.create_embeddings_with_dedup(
+            connection, tables, document_id, user_id, project_id, self._get_embedding
+        )
+        
+        logger.info(f"Metadata processing stats for doc {document_id}: {stats}")
+        return stats
     
-    async def _create_business_logic_embeddings(self, text: str, document_id: str, user_id: int, project_id: str) -> Dict[str, int]:
+    async def _create_business_logic_embeddings(
+        self, connection, text: str, document_id: str, user_id: int, project_id: str
+    ) -> Dict[str, int]:
         """Create embeddings for business logic documents with deduplication"""
         rules = self.business_logic_parser.extract_business_rules(text)
         
         # Use the deduplication method from utils
-        async with db.pool.acquire() as connection:
-            await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
-            
-            stats = await self.business_logic_parser.create_embeddings_with_dedup(
-                connection, rules, document_id, user_id, project_id, self._get_embedding
-            )
-            
-            logger.info(f"Business logic processing stats for doc {document_id}: {stats}")
-            return stats
-    
-    async def _create_reference_embeddings(self, text: str, document_id: str, user_id: int, project_id: str) -> Dict[str, int]:
-        """Create embeddings for reference documents with deduplication"""
-        chunks = self.reference_parser.split_text_into_chunks(text)
+        stats = await self.business_logic_parser.create_embeddings_with_dedup(
+            connection, rules, document_id, user_id, project_id, self._get_embedding
+        )
         
-        # Use the deduplication method from utils
-        async with db.pool.acquire() as connection:
-            await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
-            
-            stats = await self.reference_parser.create_embeddings_with_dedup(
-                connection, chunks, document_id, user_id, project_id, self._get_embedding
-            )
-            
-            logger.info(f"Reference processing stats for doc {document_id}: {stats}")
-            return stats
-
-    # Alternative batch processing method for large reference documents
+        logger.info(f"Business logic processing stats for doc {document_id}: {stats}")
+        return stats
+    
     async def _create_reference_embeddings_batch(
-        self, text: str, document_id: str, user_id: int, project_id: str
+        self, connection, text: str, document_id: str, user_id: int, project_id: str
     ) -> Dict[str, int]:
-        """Create reference embeddings using batch processing for large documents"""
+        """Create reference embeddings with deduplication, embedding new chunks in multi-input batches"""
         chunks = self.reference_parser.split_text_into_chunks(text)
-        embeddings_batch = []
+        stats = {"inserted": 0, "updated": 0, "skipped": 0, "reused": 0, "copied": 0}
         
-        # Generate all embeddings first
+        # Deduplicate by content hash before paying for any embedding calls
+        content_hashes = {}
+        candidates = []
+        seen_hashes = set()
         for chunk_idx, chunk_text in enumerate(chunks):
-            if chunk_text.strip() and len(chunk_text.strip()) > 50:
+            if not chunk_text.strip():
+                continue
+            content_hash = self.reference_parser.generate_content_hash(chunk_text)
+            # Same content earlier in this document - it will be stored once
+            if content_hash in seen_hashes:
+                stats["reused"] += 1
+                continue
+            seen_hashes.add(content_hash)
+            content_hashes[chunk_idx] = content_hash
+            candidates.append((chunk_idx, chunk_text))
+        
+        existing = await self.reference_parser.find_embeddings_by_content_hashes(
+            connection, user_id, project_id, list(seen_hashes), "reference_embeddings"
+        )
+        if existing:
+            # Compare parsed UUIDs - document_id comes back from the query as hyphenated text
+            this_document = uuid.UUID(str(document_id))
+            copy_ids, copy_indexes = [], []
+            remaining = []
+            for chunk_idx, chunk_text in candidates:
+                record = existing.get(content_hashes[chunk_idx])
+                if record is None:
+                    remaining.append((chunk_idx, chunk_text))
+                elif uuid.UUID(record['document_id']) == this_document:
+                    stats["reused"] += 1
+                else:
+                    # Owned by another document - copy it, that document keeps its chunk
+                    copy_ids.append(record['id'])
+                    copy_indexes.append(chunk_idx)
+            if copy_ids:
+                await self.reference_parser.copy_reference_embeddings(
+                    connection, copy_ids, copy_indexes, document_id
+                )
+                stats["copied"] = len(copy_ids)
+            candidates = remaining
+        
+        # Positions that already hold an embedding get updated in place rather than inserted
+        occupied_positions = await self.reference_parser.find_reference_chunk_positions(
+            connection, user_id, project_id, [chunk_idx for chunk_idx, _ in candidates]
+        )
+        
+        request_batches = [
+            candidates[i:i + EMBEDDING_BATCH_SIZE]
+            for i in range(0, len(candidates), EMBEDDING_BATCH_SIZE)
+        ]
+        
+        # Producers: one OpenAI request per batch of chunks, bounded concurrency
+        semaphore = asyncio.Semaphore(EMBEDDING_MAX_CONCURRENT_BATCHES)
+        
+        async def embed_request_batch(request_batch):
+            async with semaphore:
                 try:
-                    embedding = await self._get_embedding(chunk_text)
-                    embeddings_batch.append({
-                        'document_id': document_id,
-                        'project_id': project_id,
-                        'user_id': user_id,
-                        'chunk_index': chunk_idx,
-                        'content': chunk_text.strip(),
-                        'embedding': embedding,
-                        'metadata': {
-                            "chunk_index": chunk_idx,
-                            "chunk_type": "reference_content",
-                            "word_count": len(chunk_text.split()),
-                            "content_hash": self.reference_parser.generate_content_hash(chunk_text)
-                        }
-                    })
+                    embeddings = await self._get_embeddings_batch([chunk_text for _, chunk_text in request_batch])
                 except Exception as e:
-                    logger.error(f"Error creating embedding for chunk {chunk_idx}: {e}")
+                    logger.error(f"Error creating embeddings for chunks {request_batch[0][0]}-{request_batch[-1][0]}: {e}")
+                    embeddings = None
+                return request_batch, embeddings
         
-        # Batch insert all embeddings
-        if embeddings_batch:
-            async with db.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
-                inserted_count = await self.reference_parser.batch_insert_reference_embeddings(
+        tasks = [asyncio.create_task(embed_request_batch(request_batch)) for request_batch in request_batches]
+        
+        # Consumer: write each batch as soon as its embeddings arrive, while
+        # the remaining requests are still in flight
+        try:
+            for next_completed in asyncio.as_completed(tasks):
+                request_batch, embeddings = await next_completed
+                if embeddings is None:
+                    continue
+                
+                embeddings_batch = []
+                for (chunk_idx, chunk_text), embedding in zip(request_batch, embeddings):
+                    metadata = {
+                        "chunk_index": chunk_idx,
+                        "chunk_type": "reference_content",
+                        "word_count": len(chunk_text.split()),
+                        "content_hash": content_hashes[chunk_idx]
+                    }
+                    if chunk_idx in occupied_positions:
+                        # Different content at an existing chunk position - UPDATE
+                        await self.reference_parser._update_reference_embedding(
+                            connection, document_id, user_id, project_id,
+                            chunk_idx, chunk_text, embedding, metadata
+                        )
+                        stats["updated"] += 1
+                    else:
+                        embeddings_batch.append({
+                            'document_id': document_id,
+                            'project_id': project_id,
+                            'user_id': user_id,
+                            'chunk_index': chunk_idx,
+                            'content': chunk_text.strip(),
+                            'embedding': embedding,
+                            'metadata': metadata
+                        })
+                stats["inserted"] += await self.reference_parser.batch_insert_reference_embeddings(
                     connection, embeddings_batch
                 )
-                logger.info(f"Batch inserted {inserted_count} reference embeddings")
-                return {"inserted": inserted_count, "updated": 0, "skipped": 0}
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
         
-        return {"inserted": 0, "updated": 0, "skipped": 0}
+        logger.info(f"Reference processing stats for doc {document_id}: {stats}")
+        return stats
     
     async def _get_embedding(self, text: str) -> List[float]:
         """Create embedding using OpenAI"""
-        for attempt in range(3):
+        cache_key = text.strip()
+        cached = self._embedding_cache.get(cache_key)
+        if cached is not None:
+            self._embedding_cache.move_to_end(cache_key)
+            return cached
+        
+        for attempt in range(EMBEDDING_MAX_ATTEMPTS):
             try:
                 response = await self.openai_client.embeddings.create(
                     model=self.embed_model,
-                    input=text.strip(),
+                    input=cache_key,
                     dimensions=self.embedding_dimensions
                 )
-                return response.data[0].embedding
-            except Exception as e:
-                if attempt < 2:
-                    await asyncio.sleep(1)
+                embedding = response.data[0].embedding
+                self._embedding_cache[cache_key] = embedding
+                if len(self._embedding_cache) > EMBEDDING_CACHE_MAX_SIZE:
+                    self._embedding_cache.popitem(last=False)
+                return embedding
+            except RETRYABLE_OPENAI_ERRORS as e:
+                if attempt < EMBEDDING_MAX_ATTEMPTS - 1:
+                    await asyncio.sleep(retry_delay(getattr(e, "response", None), attempt, cap=EMBEDDING_MAX_BACKOFF))
                 else:
                     logger.error(f"Failed to get embedding: {e}")
                     raise RuntimeError(f"Failed to get embedding: {e}")
+            except Exception as e:
+                logger.error(f"Failed to get embedding: {e}")
+                raise RuntimeError(f"Failed to get embedding: {e}")
+
+    async def _get_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """Create embeddings for multiple texts in a single OpenAI request"""
+        for attempt in range(EMBEDDING_MAX_ATTEMPTS):
+            try:
+                response = await self.openai_client.embeddings.create(
+                    model=self.embed_model,
+                    input=[text.strip() for text in texts],
+                    dimensions=self.embedding_dimensions
+                )
+                # Results carry their input position; keep them aligned with texts
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            except RETRYABLE_OPENAI_ERRORS as e:
+                if attempt < EMBEDDING_MAX_ATTEMPTS - 1:
+                    await asyncio.sleep(retry_delay(getattr(e, "response", None), attempt, cap=EMBEDDING_MAX_BACKOFF))
+                else:
+                    logger.error(f"Failed to get embeddings batch: {e}")
+                    raise RuntimeError(f"Failed to get embeddings batch: {e}")
+            except Exception as e:
+                logger.error(f"Failed to get embeddings batch: {e}")
+                raise RuntimeError(f"Failed to get embeddings batch: {e}")
 
     # async def _update_document_status(self, document_id: str, status: str):
     #     """Update document processing status"""
@@ -336,17 +476,21 @@ class DocumentProcessor:
         )
         SELECT 
             json_build_object(
-                'documents', json_agg(json_build_object('type', document_type, 'status', embedding_status, 'count', count)),
+                'documents', COALESCE(
+                    (SELECT json_agg(json_build_object('type', document_type, 'status', embedding_status, 'count', count))
+                     FROM document_stats),
+                    '[]'::json
+                ),
                 'embeddings', (SELECT json_agg(json_build_object('type', type, 'count', embeddings_count)) FROM embedding_stats)
             ) as stats
-        FROM document_stats
         """
         
         try:
             async with db.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 row = await connection.fetchrow(stats_query, project_id, user_id)
-                return row['stats'] if row else {"documents": [], "embeddings": []}
+                # asyncpg returns json columns as text
+                return json.loads(row['stats']) if row else {"documents": [], "embeddings": []}
         except Exception as e:
             logger.error(f"Error getting processing statistics: {e}")
             return {"documents": [], "embeddings": []}
@@ -365,7 +509,7 @@ class DocumentProcessor:
         
         try:
             async with db.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 rows = await connection.fetch(query, project_id, user_id)
                 
                 failed_docs = [dict(row) for row in rows]
@@ -1,149 +1,568 @@
 """
 Simple Email Service - Works with existing PO workflow and routes
 """
-import sendgrid
-from sendgrid.helpers.mail import Mail, To, From, Attachment, FileContent, FileName, FileType, Disposition, Category
 import asyncio
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-from datetime import datetime
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from aiosmtplib import SMTP, SMTPServerDisconnected
+from email.message import EmailMessage, MIMEPart
+from email.policy import SMTP as SMTP_POLICY
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, List, Optional, Set
 from app.config.settings import settings
 from app.services.storage_service import storage_service
 import os
-import base64
-from jinja2 import Environment, FileSystemLoader, Template
+import io
+import pybase64
+import httpx
+import orjson
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, Template
+from markupsafe import escape
 from pathlib import Path
+from types import MappingProxyType
+from urllib.parse import quote
+from app.utils.cache_utils import TTLCache
+from app.utils.retry_utils import retry_delay
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _format_money(value) -> str:
+    """Jinja filter: 1234.5 -> '1,234.50'"""
+    return format(value, ',.2f')
+
+
+def _build_template_env():
+    """Setup Jinja2 template environment - Production Ready"""
+    try:
+        # Since email_service.py is in app/services/, go up to app/ then to templates/emails/
+        base_dir = Path(__file__).parent.parent  # Goes from services/ to app/
+        template_dir = base_dir / "templates" / "emails"
+        
+        if not template_dir.exists():
+            logger.error("❌ Template directory not found: %s", template_dir)
+            return None
+        
+        # Compiled template bytecode survives worker restarts; point
+        # JINJA_BYTECODE_CACHE_DIR at a cache prebuilt in the image to skip compiling entirely.
+        # Cache files are loaded as code, so the directory must be private to this user -
+        # without the setting, Jinja picks a per-user temp dir and checks its permissions
+        if settings.JINJA_BYTECODE_CACHE_DIR:
+            os.makedirs(settings.JINJA_BYTECODE_CACHE_DIR, mode=0o700, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(directory=settings.JINJA_BYTECODE_CACHE_DIR, pattern='%s.cache')
+        else:
+            bytecode_cache = FileSystemBytecodeCache(pattern='%s.cache')
+        
+        # Missing templates raise TemplateNotFound on first render - fallback handles them
+        env = Environment(
+            loader=FileSystemLoader(template_dir),
+            autoescape=True,
+            bytecode_cache=bytecode_cache,
+            # Templates ship with the app - never stat them, never evict them
+            auto_reload=False,
+            cache_size=-1
+        )
+        env.filters['money'] = _format_money
+        return env
+        
+    except Exception as e:
+        logger.error("❌ Failed to setup template environment: %s", e)
+        return None
+
+
+def _load_templates(env) -> Dict[str, Template]:
+    """Compile the known email templates up front"""
+    templates = {}
+    if not env:
+        return templates
+    
+    # One directory listing instead of a stat per expected template
+    present = set(env.list_templates())
+    missing_templates = [name for name in EMAIL_TEMPLATES if name not in present]
+    if missing_templates:
+        logger.warning("⚠️ Missing templates: %s", missing_templates)
+        # Continue anyway - fallback will handle missing templates
+    
+    for template_name in EMAIL_TEMPLATES:
+        if template_name not in present:
+            continue
+        try:
+            templates[template_name] = env.get_template(template_name)
+        except Exception as e:
+            logger.warning("⚠️ Could not load template %s: %s", template_name, e)
+    return templates
+
+
+def _direct_renderer(template: Template) -> Callable[[dict], str]:
+    """Call the template's compiled root function directly, skipping Template.render's wrapper"""
+    root_render_func = template.root_render_func
+    new_context = template.new_context
+    concat = template.environment.concat
+    
+    def render(template_data: dict) -> str:
+        return concat(root_render_func(new_context(template_data)))
+    
+    return render
+
+
+EMAIL_TEMPLATES = ('po_approval.html', 'po_to_vendor.html', 'po_status_notification.html')
+
+# Module-level query text: prepared once per pooled connection, not once per send
+GET_VENDOR_PO_SQL = """
+SELECT po_number, vendor_name, total_amount, order_date
+FROM purchase_orders WHERE po_number = $1
+"""
+
+FALLBACK_HTML_TEMPLATE = """
+        <!DOCTYPE html>
+        <html>
+        <head><title>{subject}</title></head>
+        <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
+            <h2>{company_name}</h2>
+            <p>This is a notification from our system.</p>
+            <p>Please check the attached document for details.</p>
+            <hr>
+            <p style="font-size: 12px; color: #666;">
+                {company_name} | {company_email}
+            </p>
+        </body>
+        </html>
+        """
+
+# Status notification settings, with the derived text forms computed once;
+# read-only so no send can alter them for the next one
+_STATUS_CONFIG = {
+    "approved": {
+        "status": "approved",
+        "subject_prefix": "✅",
+        "status_text": "APPROVED",
+        "status_icon": "✅"
+    },
+    "rejected": {
+        "status": "rejected",
+        "subject_prefix": "❌",
+        "status_text": "REJECTED",
+        "status_icon": "❌"
+    },
+    "sent_to_vendor": {
+        "status": "sent_to_vendor",
+        "subject_prefix": "📤",
+        "status_text": "SENT TO VENDOR",
+        "status_icon": "📤"
+    }
+}
+STATUS_CONFIG = MappingProxyType({
+    status: MappingProxyType({
+        **config,
+        "status_text_title": config["status_text"].title(),
+        "status_text_lower": config["status_text"].lower(),
+    })
+    for status, config in _STATUS_CONFIG.items()
+})
+
+STATUS_SUBJECT_FMT = "{prefix} PO {po} {title} - {vendor}"
+
+# Approval link path; joined to the live API_BASE_URL at send time
+APPROVAL_LINK_PATH_FMT = "/po/approval/{token}/{action}-direct?approver_email={email}"
+
+_last_stamp = (0, "")
+
+
+def _now_stamp() -> str:
+    """Current time as 'YYYY-MM-DD HH:MM:SS', formatted at most once per second"""
+    global _last_stamp
+    now = int(time.time())
+    if _last_stamp[0] != now:
+        _last_stamp = (now, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now)))
+    return _last_stamp[1]
+
+
+# Emails submitted within this window share one SMTP session
+EMAIL_BATCH_MAX_SIZE = 32
+EMAIL_BATCH_MAX_WAIT = 0.05
+
+# Vendor emails prepared (lookup, download, render) concurrently in send_bulk
+BULK_SEND_CONCURRENCY = 8
+
+SENDGRID_API_URL = "https://api.sendgrid.com"
+# SendGrid throttling (429) and transient 5xx are retried with exponential backoff + jitter
+SENDGRID_MAX_ATTEMPTS = 3
+SENDGRID_BASE_BACKOFF = 0.5
+SENDGRID_MAX_BACKOFF = 8.0
+SENDGRID_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# A batch stops early once more than this share of it has failed (and at least
+# SMTP_BATCH_ABORT_MIN_FAILURES sends) - the server is refusing, not one bad address
+SMTP_BATCH_ABORT_RATIO = 1 / 3
+SMTP_BATCH_ABORT_MIN_FAILURES = 3
+
+# Pooled SMTP sessions idle longer than this get a NOOP before reuse
+SMTP_NOOP_AFTER_IDLE = 60.0
+
+# Providers cap messages per session (commonly 100) - recycle a session before it hits the cap
+SMTP_MAX_MESSAGES_PER_SESSION = 100
+
+# base64 turns each 57-byte block into exactly one 76-char MIME line
+BASE64_LINE_BYTES = 57
+
+
+async def _encode_attachment(chunks: AsyncIterator[bytes]) -> str:
+    """Base64-encode a streamed attachment into MIME lines as chunks arrive (SIMD codec)"""
+    encoded = io.StringIO()
+    pending = bytearray()
+    async for chunk in chunks:
+        pending += chunk
+        usable = len(pending) - len(pending) % BASE64_LINE_BYTES
+        if usable:
+            # Encode straight from the buffer - slicing the bytearray would copy it first
+            with memoryview(pending) as view:
+                encoded.write(pybase64.encodebytes(view[:usable]).decode('ascii'))
+            del pending[:usable]
+    if pending:
+        encoded.write(pybase64.encodebytes(pending).decode('ascii'))
+    return encoded.getvalue()
+
+
+# PO PDFs do not change once generated; approve -> notify -> vendor reuse one download
+PDF_ATTACHMENT_CACHE_TTL = 300.0
+PDF_ATTACHMENT_CACHE_MAX_SIZE = 32
+_pdf_attachment_cache = TTLCache(PDF_ATTACHMENT_CACHE_TTL, PDF_ATTACHMENT_CACHE_MAX_SIZE)  # pdf_path -> task
+
+
+async def _fetch_pdf_attachment(pdf_path: str) -> str:
+    """Base64 attachment body for a PO PDF, shared by concurrent and repeat sends"""
+    cached = _pdf_attachment_cache.get(pdf_path)
+    if cached is not None:
+        return await asyncio.shield(cached)
+    
+    task = asyncio.ensure_future(_encode_attachment(storage_service.stream_po_pdf(pdf_path)))
+    _pdf_attachment_cache.set(pdf_path, task)
+    try:
+        return await asyncio.shield(task)
+    except Exception:
+        if _pdf_attachment_cache.get(pdf_path) is task:
+            _pdf_attachment_cache.pop(pdf_path)
+        raise
+
+
+# Built once at import and reused by every EmailService instance
+_TEMPLATE_ENV = _build_template_env()
+_TEMPLATES = _load_templates(_TEMPLATE_ENV)
+_RENDERERS = {name: _direct_renderer(template) for name, template in _TEMPLATES.items()}
+
+
+class EmailBatcher:
+    """
+    Coalesces emails submitted within a short window into one batch, so a
+    burst of notifications shares one SMTP session. Each caller still gets
+    its own result.
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]],
+        max_batch_size: int = EMAIL_BATCH_MAX_SIZE,
+        max_queue_time: float = EMAIL_BATCH_MAX_WAIT
+    ):
+        self._send_batch = send_batch
+        self._max_batch_size = max_batch_size
+        self._max_queue_time = max_queue_time
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+    async def submit(self, email: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue one email and wait for its result"""
+        if self._worker is None or self._worker.done():
+            # Started lazily - needs the running event loop
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._collect())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((email, future))
+        return await future
+
+    async def _collect(self):
+        """Gather queued emails into batches and hand each batch off for sending"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._max_queue_time
+            while len(batch) < self._max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Batches send concurrently, bounded by the SMTP pool size
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[tuple]):
+        """Send one batch and resolve each caller's future"""
+        try:
+            results = await self._send_batch([email for email, _ in batch])
+        except Exception as e:
+            logger.error("❌ Email batch failed: %s", e)
+            results = [{"success": False, "error": str(e)} for _ in batch]
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        """Stop collecting; batches already being sent are allowed to finish"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+
+class RateLimiter:
+    """
+    Token bucket: up to `rate` calls may start in any one-second window -
+    a full burst goes straight through after idle, then calls are spaced
+    1/rate apart.
+    """
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate
+        self._burst = 1.0 - self._interval
+        self._next_slot = 0.0
+
+    async def acquire(self):
+        """Wait for this call's slot"""
+        now = asyncio.get_running_loop().time()
+        slot = max(self._next_slot, now - self._burst)
+        self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def _quit_smtp(client: SMTP):
+    """Politely end a session; a failed QUIT just drops the connection"""
+    if client.is_connected:
+        try:
+            await client.quit()
+        except Exception as e:
+            logger.warning("Error closing SMTP session: %s", e)
+            client.close()
+
+
+class SMTPSession:
+    """A pooled SMTP connection and the number of messages sent on it"""
+
+    def __init__(self, client: SMTP, factory: Callable[[], Awaitable[SMTP]], max_messages: int):
+        self.client = client
+        self.sent_count = 0
+        self._factory = factory
+        self._max_messages = max_messages
+
+    async def sendmail(self, sender: str, recipients: List[str], message: bytes):
+        """Send one message, recycling the connection at the message cap or if the server dropped it"""
+        if self.sent_count >= self._max_messages:
+            await _quit_smtp(self.client)
+            await self._reconnect()
+        try:
+            await self.client.sendmail(sender, recipients, message)
+        except SMTPServerDisconnected:
+            await self._reconnect()
+            await self.client.sendmail(sender, recipients, message)
+        self.sent_count += 1
+
+    async def _reconnect(self):
+        self.client = await self._factory()
+        self.sent_count = 0
+
+
+class SMTPPool:
+    """
+    Bounded pool of authenticated SMTP sessions. At most `size` sessions are
+    open at once; idle ones are reused most-recent-first and probed with NOOP
+    only if they sat idle a while.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        factory: Callable[[], Awaitable[SMTP]],
+        max_messages: int = SMTP_MAX_MESSAGES_PER_SESSION
+    ):
+        self._factory = factory
+        self._max_messages = max_messages
+        self._slots = asyncio.Semaphore(size)
+        self._idle: List[tuple] = []  # (session, last_used)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[SMTPSession]:
+        """Borrow a session for a run of sends; it goes back to the pool if still connected"""
+        async with self._slots:
+            session = await self._checkout()
+            try:
+                yield session
+            finally:
+                if session.client.is_connected:
+                    self._idle.append((session, time.monotonic()))
+
+    async def _checkout(self) -> SMTPSession:
+        while self._idle:
+            session, last_used = self._idle.pop()
+            if not session.client.is_connected:
+                continue
+            if time.monotonic() - last_used < SMTP_NOOP_AFTER_IDLE:
+                return session
+            try:
+                await session.client.noop()
+                return session
+            except Exception:
+                logger.info("SMTP session stale, reconnecting")
+        return SMTPSession(await self._factory(), self._factory, self._max_messages)
+
+    async def close(self):
+        """Close every idle session"""
+        while self._idle:
+            session, _ = self._idle.pop()
+            await _quit_smtp(session.client)
+
+
 class EmailService:
     def __init__(self):
-        self.smtp_server = settings.SMTP_SERVER
-        self.smtp_port = settings.SMTP_PORT
-        self.email_user = settings.SMTP_USERNAME
-        self.email_password = settings.SMTP_PASSWORD
-        self.company_email = settings.COMPANY_EMAIL
-        self.company_name = settings.COMPANY_NAME
-        self.company_phone = settings.COMPANY_PHONE
-        self.company_website = settings.COMPANY_WEBSITE
-        self.company_contact_name = settings.COMPANY_CONTACT_NAME
-        # Setup Jinja2 environment for templates
-        self.template_env = self._setup_template_environment()
-        self.from_email = settings.SENDGRID_FROM_EMAIL
-        self.email_provider = settings.EMAIL_PROVIDER
-        self.sg = None
+        # Jinja2 environment is shared process-wide; pick the renderer once
+        self.template_env = _TEMPLATE_ENV
+        self._render_template = self._render_real if self.template_env else self._render_without_env
+        # Dedicated threads for render/serialize work, so email bursts and the rest
+        # of the app cannot starve each other on the shared default executor
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.EMAIL_WORKER_THREADS, thread_name_prefix="email-io"
+        )
+        # Small pool of authenticated SMTP sessions reused across sends
+        self._smtp_pool = SMTPPool(settings.SMTP_POOL_SIZE, self._connect_smtp)
+        self._smtp_batcher = EmailBatcher(self._send_smtp_batch)
+        # Escaped company fields, rebuilt only when the company settings change
+        self._company_ctx_key: Optional[tuple] = None
+        self._company_ctx: Optional[MappingProxyType] = None
+        self.sg: Optional[httpx.AsyncClient] = None
         if self.email_provider == 'sendgrid':
             api_key = getattr(settings, 'SENDGRID_API_KEY', None)
             if api_key:
-                self.sg = sendgrid.SendGridAPIClient(api_key=api_key)
-                logger.info(f"✅ SendGrid client initialized")
+                # Kept for the service's lifetime so bursts of sends ride the already-open HTTP/2 connection
+                self.sg = httpx.AsyncClient(
+                    base_url=SENDGRID_API_URL,
+                    http2=True,
+                    timeout=10,
+                    headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+                )
+                self._sendgrid_limiter = RateLimiter(settings.SENDGRID_MAX_RPS)
+                logger.info("✅ SendGrid client initialized")
             else:
                 logger.error("❌ SENDGRID_API_KEY not found but EMAIL_PROVIDER=sendgrid")
-    
 
-    def _setup_template_environment(self):
-        """Setup Jinja2 template environment - Production Ready"""
-        try:
-            # Use environment variable or fallback to multiple paths
-            # template_paths = [
-                
-            #     # Production path (if deployed with templates)
-            #     '/app/templates/emails',
-                
-            #     # Development path
-            #     str(Path(__file__).parent.parent / "templates" / "emails"),
-                
-            #     # Alternative development paths
-            #     str(Path.cwd() / "app" / "templates" / "emails"),
-            #     str(Path.cwd() / "templates" / "emails"),
-            # ]
-            
-            # # Find the first valid template directory
-            # template_dir = None
-            # for path in template_paths:
-            #     if path and os.path.exists(path) and os.path.isdir(path):
-            #         template_dir = path
-            #         logger.info(f"✅ Found template directory: {template_dir}")
-            #         break
-            
-            # if not template_dir:
-            #     logger.warning(f"❌ No template directory found. Searched: {[p for p in template_paths if p]}")
-            #     return None
-            # Since email_service.py is in app/services/, go up to app/ then to templates/emails/
-            base_dir = Path(__file__).parent.parent  # Goes from services/ to app/
-            template_dir = base_dir / "templates" / "emails"
-            
-            if not template_dir.exists():
-                logger.error(f"❌ Template directory not found: {template_dir}")
-                return None
-            # Verify templates exist
-            required_templates = ['po_approval.html', 'po_to_vendor.html', 'po_status_notification.html']
-            missing_templates = []
-            
-            for template_name in required_templates:
-                template_path = os.path.join(template_dir, template_name)
-                if not os.path.exists(template_path):
-                    missing_templates.append(template_name)
-            
-            if missing_templates:
-                logger.warning(f"⚠️ Missing templates: {missing_templates}")
-                # Continue anyway - fallback will handle missing templates
-            
-            # Setup Jinja2 environment
-            env = Environment(
-                loader=FileSystemLoader(template_dir),
-                autoescape=True,
-                # Production optimizations
-                auto_reload=False if os.getenv('ENVIRONMENT') == 'production' else True,
-                cache_size=100
-            )
-            
-            # logger.info(f"✅ Template environment setup successfully at: {template_dir}")
-            return env
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to setup template environment: {e}")
-            return None
+    # Settings are read live so a settings reload is picked up without re-creating the service
+    @property
+    def smtp_server(self) -> str:
+        return settings.SMTP_SERVER
 
-        
-    def _render_template(self, template_name: str, template_data: dict) -> str:
+    @property
+    def smtp_port(self) -> int:
+        return settings.SMTP_PORT
+
+    @property
+    def email_user(self) -> str:
+        return settings.SMTP_USERNAME
+
+    @property
+    def email_password(self) -> str:
+        return settings.SMTP_PASSWORD
+
+    @property
+    def company_email(self) -> str:
+        return settings.COMPANY_EMAIL
+
+    @property
+    def company_name(self) -> str:
+        return settings.COMPANY_NAME
+
+    @property
+    def company_phone(self) -> str:
+        return settings.COMPANY_PHONE
+
+    @property
+    def company_website(self) -> str:
+        return settings.COMPANY_WEBSITE
+
+    @property
+    def company_contact_name(self) -> str:
+        return settings.COMPANY_CONTACT_NAME
+
+    @property
+    def from_email(self) -> str:
+        return settings.SENDGRID_FROM_EMAIL
+
+    @property
+    def email_provider(self) -> str:
+        return settings.EMAIL_PROVIDER
+
+    @property
+    def _base_template_ctx(self) -> MappingProxyType:
+        """
+        Company fields shared by every template. Escaped once and reused until
+        a settings reload changes one of them.
+        escape() returns Markup, which autoescape passes through untouched.
+        """
+        company = (
+            self.company_name, self.company_email, self.company_phone,
+            self.company_website, self.company_contact_name
+        )
+        if company != self._company_ctx_key:
+            name, help_email, phone, website, contact_name = company
+            self._company_ctx = MappingProxyType({
+                "company_name": escape(name),
+                "help_email": escape(help_email),
+                "company_phone": escape(phone),
+                "company_website": escape(website),
+                "company_contact_name": escape(contact_name),
+            })
+            self._company_ctx_key = company
+        return self._company_ctx
+
+    def _render_real(self, template_name: str, template_data: dict) -> str:
         """Render email template with data"""
         try:
-            if not self.template_env:
-                logger.error("❌ Template environment not available")
-                return self._get_fallback_html(template_data)
-            
-            template = self.template_env.get_template(template_name)
-            html_content = template.render(**template_data)
-            logger.info(f"✅ Template {template_name} rendered successfully")
+            render = _RENDERERS.get(template_name)
+            if render is not None:
+                html_content = render(template_data)
+            else:
+                html_content = self.template_env.get_template(template_name).render(**template_data)
+            logger.debug("✅ Template %s rendered successfully", template_name)
             return html_content
             
         except Exception as e:
-            logger.error(f"❌ Error rendering template {template_name}: {e}")
+            logger.error("❌ Error rendering template %s: %s", template_name, e)
             return self._get_fallback_html(template_data)
 
+    async def _render_async(self, template_name: str, template_data: dict) -> str:
+        """Render off the event loop on the email worker threads"""
+        return await self._run_blocking(self._render_template, template_name, template_data)
+
+    async def _run_blocking(self, fn: Callable[..., Any], *args) -> Any:
+        """Run a blocking call on the email service's own thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _render_without_env(self, template_name: str, template_data: dict) -> str:
+        """Renderer used when no template environment could be built"""
+        logger.error("❌ Template environment not available")
+        return self._get_fallback_html(template_data)
+
     def _get_fallback_html(self, data: dict) -> str:
         """Simple fallback HTML if template fails"""
-        return f"""
-        <!DOCTYPE html>
-        <html>
-        <head><title>{data.get('subject', 'Email from ' + self.company_name)}</title></head>
-        <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-            <h2>{self.company_name}</h2>
-            <p>This is a notification from our system.</p>
-            <p>Please check the attached document for details.</p>
-            <hr>
-            <p style="font-size: 12px; color: #666;">
-                {self.company_name} | {self.company_email}
-            </p>
-        </body>
-        </html>
-        """
+        return FALLBACK_HTML_TEMPLATE.format_map({
+            'subject': data.get('subject', f'Email from {self.company_name}'),
+            'company_name': self.company_name,
+            'company_email': self.company_email,
+        })
 
     async def send_po_approval_email_with_token(
         self, 
@@ -169,100 +588,115 @@ class EmailService:
             subject = f"URGENT: PO Approval Required - {po_number} (${total_amount:,.2f})"
             
             # Links to your frontend pages that will call your existing API routes
-            approve_link = f"{settings.API_BASE_URL}/po/approval/{approval_token}/approve-direct?approver_email={approver_email}"
-            reject_link = f"{settings.API_BASE_URL}/po/approval/{approval_token}/reject-direct?approver_email={approver_email}"
+            quoted_email = quote(approver_email, safe='@')
+            api_base_url = settings.API_BASE_URL
+            approve_link = api_base_url + APPROVAL_LINK_PATH_FMT.format(
+                token=approval_token, action="approve", email=quoted_email
+            )
+            reject_link = api_base_url + APPROVAL_LINK_PATH_FMT.format(
+                token=approval_token, action="reject", email=quoted_email
+            )
 
             # Prepare template data
             template_data = {
-                "company_name": self.company_name,
+                **self._base_template_ctx,
                 "approver_name": approver_name,
                 "po_number": po_number,
                 "vendor_name": vendor_name,
                 "vendor_email": vendor_email,
-                "total_amount": f"{total_amount:,.2f}",
-                "order_numbers": ", ".join(order_numbers) if isinstance(order_numbers, list) else str(order_numbers),
+                "total_amount": total_amount,
+                "order_numbers": ", ".join(order_numbers),
                 "threshold": f"{approval_threshold:,.0f}",
                 "approve_link": approve_link,
                 "reject_link": reject_link,
                 "approval_token": approval_token[:8],
-                "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                "help_email": self.company_email,
+                "timestamp": _now_stamp(),
                 "subject": subject,
             }
-            print("_________________________________________________________",template_data['threshold'])
-            # Render template
-            html_body = self._render_template("po_approval.html", template_data)
-
-            # Download PDF from storage for email attachment
-            pdf_content = await storage_service.download_po_pdf(pdf_path)
+            # Render template off the loop while the PDF streams in from storage
+            html_body, pdf_base64 = await asyncio.gather(
+                self._render_async("po_approval.html", template_data),
+                _fetch_pdf_attachment(pdf_path)
+            )
             
             result = await self._send_email_with_attachment(
                 to_email=approver_email,
                 subject=subject,
                 html_body=html_body,
-                attachment_content=pdf_content,
+                attachment_base64=pdf_base64,
                 attachment_name=f"{po_number}.pdf"
             )
             
             if result["success"]:
-                logger.info(f"Approval email with PO PDF attachment sent to {approver_email} for PO {po_number}")
+                logger.info("Approval email with PO PDF attachment sent to %s for PO %s", approver_email, po_number)
             
             return result
                 
         except Exception as e:
-            logger.error(f"Error sending approval email: {e}")
+            logger.exception("Error sending approval email")
             return {"success": False, "error": str(e)}
 
-    async def send_po_to_vendor(self, po_number: str, vendor_email: str, pdf_path: str) -> Dict[str, Any]:
-        """Send approved PO to vendor with PDF attached"""
+    async def send_po_to_vendor(
+        self,
+        po_number: str,
+        vendor_email: str,
+        pdf_path: str,
+        po_details: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Send approved PO to vendor with PDF attached.
+        Callers that already hold the PO row (po_number, vendor_name, total_amount,
+        order_date) pass it as po_details to skip the lookup.
+        """
         
         try:
-            # Get PO details from database
-            from app.database.connection import db
-            async with db.pool.acquire() as connection:
-                po_details = await connection.fetchrow("""
-                    SELECT po_number, vendor_name, total_amount, order_date
-                    FROM purchase_orders WHERE po_number = $1
-                """, po_number)
-            
-            if not po_details:
-                return {"success": False, "error": "PO not found"}
+            pdf_base64 = None
+            if po_details is None:
+                # Get PO details from database
+                from app.database.connection import db
+                
+                # The PDF download does not depend on the PO row - run both at once
+                po_details, pdf_base64 = await asyncio.gather(
+                    db.pool.fetchrow(GET_VENDOR_PO_SQL, po_number),
+                    _fetch_pdf_attachment(pdf_path)
+                )
+                
+                if not po_details:
+                    return {"success": False, "error": "PO not found"}
             
             subject = f"📋 Purchase Order {po_details['po_number']} - {self.company_name}"
             template_data = {
-                "company_name": self.company_name,
+                **self._base_template_ctx,
                 "vendor_name": po_details['vendor_name'],
                 "po_number": po_details['po_number'],
-                "total_amount": f"{po_details['total_amount']:,.2f}",
+                "total_amount": po_details['total_amount'],
                 "order_date": po_details['order_date'].strftime('%B %d, %Y') if po_details['order_date'] else 'N/A',
-                "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                "help_email": self.company_email,
-                "company_phone": self.company_phone,
-                "company_website": self.company_website,
-                "company_contact_name": self.company_contact_name,
+                "timestamp": _now_stamp(),
                 "subject": subject,
             }
-            # Render template
-            html_body = self._render_template("po_to_vendor.html", template_data)
-            
-            # Download PDF from storage for attachment
-            pdf_content = await storage_service.download_po_pdf(pdf_path)
+            # Render template off the event loop
+            render = self._render_async("po_to_vendor.html", template_data)
+            if pdf_base64 is None:
+                # No lookup ran alongside the download - overlap it with the render instead
+                html_body, pdf_base64 = await asyncio.gather(render, _fetch_pdf_attachment(pdf_path))
+            else:
+                html_body = await render
             
             result = await self._send_email_with_attachment(
                 to_email=vendor_email,
                 subject=subject,
                 html_body=html_body,
-                attachment_content=pdf_content,
+                attachment_base64=pdf_base64,
                 attachment_name=f"{po_details['po_number']}.pdf"
             )
             
             if result["success"]:
-                logger.info(f"PO {po_details['po_number']} with PDF attachment sent to vendor {vendor_email}")
+                logger.info("PO %s with PDF attachment sent to vendor %s", po_details['po_number'], vendor_email)
             
             return result
             
         except Exception as e:
-            logger.error(f"Error sending PO to vendor: {e}")
+            logger.exception("Error sending PO to vendor")
             return {"success": False, "error": str(e)}
 
     async def send_po_status_notification(
@@ -278,72 +712,54 @@ class EmailService:
         """Send status notification to user with PO PDF attached"""
         
         try:
-            # Status configuration
-            status_config = {
-                "approved": {
-                    "staus": "approved",
-                    "subject_prefix": "✅",
-                    "status_text": "APPROVED",
-                    "status_icon": "✅"
-                },
-                "rejected": {
-                    "status": "rejected",
-                    "subject_prefix": "❌",
-                    "status_text": "REJECTED",
-                    "status_icon": "❌"
-                },
-                "sent_to_vendor": {
-                    "status": "sent_to_vendor",
-                    "subject_prefix": "📤",
-                    "status_text": "SENT TO VENDOR",
-                    "status_icon": "📤"
-                }
-            }
-
-            config = status_config.get(status, status_config["approved"])
-            subject = f"{config['subject_prefix']} PO {po_number} {config['status_text'].title()} - {vendor_name}"
-            # Prepare template data
+            config = STATUS_CONFIG.get(status, STATUS_CONFIG["approved"])
+            subject = STATUS_SUBJECT_FMT.format(
+                prefix=config["subject_prefix"], po=po_number, title=config["status_text_title"], vendor=vendor_name
+            )
+            # Prepare template data - both date fields from one instant so they agree
+            now = time.localtime()
             template_data = {
-                "company_name": self.company_name,
+                **self._base_template_ctx,
                 "po_number": po_number,
                 "vendor_name": vendor_name,
-                "total_amount": f"{total_amount:,.2f}",
+                "total_amount": total_amount,
                 "status": status,
                 "status_text": config["status_text"],
-                # "status_color": config["status_color"],
                 "status_icon": config["status_icon"],
-                "status_message": f"PO {po_number} has been {config['status_text'].lower()}",
+                "status_message": f"PO {po_number} has been {config['status_text_lower']}",
                 "comment": comment or "",
                 "has_comment": comment is not None,
-                "current_date": datetime.now().strftime('%B %d, %Y at %I:%M %p'),
-                "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                "help_email": self.company_email,
+                "current_date": time.strftime('%B %d, %Y at %I:%M %p', now),
+                "timestamp": time.strftime('%Y-%m-%d %H:%M:%S', now),
                 "subject": subject,
             }
 
-            # Render template
-            html_body = self._render_template("po_status_notification.html", template_data)
-            
-            # Download PDF for attachment if provided
-            pdf_content = None
+            # Render template off the event loop, alongside the PDF download if there is one
+            render = self._render_async("po_status_notification.html", template_data)
+            pdf_base64 = None
             if pdf_path:
-                pdf_content = await storage_service.download_po_pdf(pdf_path)
+                html_body, pdf_base64 = await asyncio.gather(
+                    render,
+                    _fetch_pdf_attachment(pdf_path)
+                )
+            else:
+                html_body = await render
             
             result = await self._send_email_with_attachment(
                 to_email=user_email,
                 subject=subject,
                 html_body=html_body,
-                attachment_content=pdf_content,
-                attachment_name=f"{po_number}.pdf" if pdf_content else None
+                attachment_base64=pdf_base64,
+                attachment_name=f"{po_number}.pdf" if pdf_base64 else None
             )
             
             if result["success"]:
-                logger.info(f"Status notification with PDF sent to {user_email} for PO {po_number}")
+                logger.info("Status notification with PDF sent to %s for PO %s", user_email, po_number)
             
             return result
             
         except Exception as e:
-            logger.error(f"Error sending status notification: {e}")
+            logger.exception("Error sending status notification")
             return {"success": False, "error": str(e)}
         
     async def _send_email_with_attachment(
@@ -351,7 +767,7 @@ class EmailService:
         to_email: str, 
         subject: str, 
         html_body: str, 
-        attachment_content: bytes = None,
+        attachment_base64: str = None,
         attachment_name: str = None
     ) -> Dict[str, Any]:
         """Send email with optional PDF attachment via SendGrid"""
@@ -359,7 +775,7 @@ class EmailService:
         try:
             # Route based on provider
             if not to_email or not isinstance(to_email, str):
-                logger.error(f"❌ Invalid to_email: {to_email}")
+                logger.error("❌ Invalid to_email: %s", to_email)
                 return {"success": False, "error": "Invalid email address"}
             
             # Route based on provider
@@ -367,18 +783,18 @@ class EmailService:
                 if not self.sg:
                     logger.error("❌ SendGrid client not available, falling back to SMTP")
                     return await self._send_via_smtp(
-                        to_email, subject, html_body, attachment_content, attachment_name
+                        to_email, subject, html_body, attachment_base64, attachment_name
                     )
                 return await self._send_via_sendgrid(
-                    to_email, subject, html_body, attachment_content, attachment_name
+                    to_email, subject, html_body, attachment_base64, attachment_name
                 )
             else:
                 return await self._send_via_smtp(
-                    to_email, subject, html_body, attachment_content, attachment_name
+                    to_email, subject, html_body, attachment_base64, attachment_name
                 )
                 
         except Exception as e:
-            logger.error(f"❌ Email sending error: {e}")
+            logger.error("❌ Email sending error: %s", e)
             return {"success": False, "error": str(e)}
         
     async def _send_via_sendgrid(
@@ -386,7 +802,7 @@ class EmailService:
         to_email: str,
         subject: str,
         html_body: str,
-        attachment_content: bytes = None,
+        attachment_base64: str = None,
         attachment_name: str = None
     ) -> Dict[str, Any]:
         """Send email via SendGrid HTTP API"""
@@ -396,146 +812,191 @@ class EmailService:
                 logger.error("❌ SendGrid client not initialized")
                 return {"success": False, "error": "SendGrid client not initialized"}
             
-            # Ensure to_email is a string (SendGrid Mail handles both string and list)
+            # Ensure to_email is a string
             to_emails = to_email if isinstance(to_email, str) else str(to_email)
-            # Create Mail object
-            message = Mail(
-                from_email=From(self.from_email),
-                to_emails=[To(to_emails)],
-                subject=subject,
-                html_content=html_body
-            )
+            # v3 mail/send body built directly - no helper objects to validate and re-serialize
+            payload = {
+                "personalizations": [{"to": [{"email": to_emails}]}],
+                "from": {"email": self.from_email},
+                "subject": subject,
+                "content": [{"type": "text/html", "value": html_body}],
+                # Category for tracking
+                "categories": ["po-workflow"],
+            }
             
             # Add PDF attachment if provided
-            if attachment_content and attachment_name:
-                logger.info(f"📎 Adding attachment: {attachment_name}")
-                encoded_file = base64.b64encode(attachment_content).decode()
-                
-                attached_file = Attachment(
-                    FileContent(encoded_file),
-                    FileName(attachment_name),
-                    FileType('application/pdf'),
-                    Disposition('attachment')
-                )
-                message.add_attachment(attached_file)
-                logger.info(f"✅ Attachment added successfully")
-            
-            # Add category for tracking
-            message.add_category(Category('po-workflow'))
+            if attachment_base64 and attachment_name:
+                logger.debug("📎 Adding attachment: %s", attachment_name)
+                # SendGrid expects unwrapped base64 - strip line breaks off the event loop
+                unwrapped = await self._run_blocking(attachment_base64.replace, '\n', '')
+                payload["attachments"] = [{
+                    "content": unwrapped,
+                    "filename": attachment_name,
+                    "type": "application/pdf",
+                    "disposition": "attachment",
+                }]
             
             # Send via SendGrid API
-            logger.info(f"🚀 Sending email...")
-            logger.info(f"   From: {self.from_email}")
-            logger.info(f"   To: {to_emails}")
-        
-            logger.info(f"🚀 Sending email via SendGrid...")
-            response = await asyncio.to_thread(self.sg.send, message)
-            logger.info(f"📨 SendGrid response status: {response.status_code}")
+            logger.debug("🚀 Sending email via SendGrid from %s to %s", self.from_email, to_emails)
+            response = await self._post_sendgrid(payload)
+            logger.debug("📨 SendGrid response status: %s", response.status_code)
             if response.status_code == 202:
-                logger.info(f"✅ SendGrid email sent successfully to {to_email}")
+                logger.info("✅ SendGrid email sent successfully to %s", to_email)
                 return {"success": True, "message": f"Email sent to {to_email}"}
             else:
-                logger.error(f"❌ SendGrid returned status {response.status_code}: {response.body}")
+                logger.error("❌ SendGrid returned status %s: %s", response.status_code, response.text)
                 return {"success": False, "error": f"SendGrid error: {response.status_code}"}
                 
         except Exception as e:
-            logger.error(f"❌ SendGrid send failed: {str(e)}")
+            logger.exception("❌ SendGrid send failed")
             return {"success": False, "error": str(e)}
         
+    async def _post_sendgrid(self, payload: Dict[str, Any]) -> httpx.Response:
+        """POST one mail send, rate limited; 429/5xx and connection errors are retried with backoff"""
+        # Serialized once, reused by retries - orjson is much faster on the large base64 attachment
+        body = orjson.dumps(payload)
+        for attempt in range(SENDGRID_MAX_ATTEMPTS):
+            last_attempt = attempt == SENDGRID_MAX_ATTEMPTS - 1
+            await self._sendgrid_limiter.acquire()
+            try:
+                response = await self.sg.post("/v3/mail/send", content=body)
+            except httpx.TransportError as e:
+                if last_attempt:
+                    raise
+                delay = retry_delay(None, attempt, SENDGRID_BASE_BACKOFF, SENDGRID_MAX_BACKOFF)
+                logger.warning("⚠️ SendGrid request failed (%s), retrying in %.1fs", e, delay)
+            else:
+                if response.status_code not in SENDGRID_RETRY_STATUSES or last_attempt:
+                    return response
+                delay = retry_delay(response, attempt, SENDGRID_BASE_BACKOFF, SENDGRID_MAX_BACKOFF)
+                logger.warning("⚠️ SendGrid returned %s, retrying in %.1fs", response.status_code, delay)
+            await asyncio.sleep(delay)
+
     async def _send_via_smtp(
         self,
         to_email: str,
         subject: str,
         html_body: str,
-        attachment_content: bytes = None,
+        attachment_base64: str = None,
         attachment_name: str = None
     ) -> Dict[str, Any]:
-        """Send email via SMTP (fallback for local dev)"""
+        """Send email via SMTP (fallback for local dev) - coalesced with concurrent sends"""
+        return await self._smtp_batcher.submit({
+            "to_email": to_email,
+            "subject": subject,
+            "html_body": html_body,
+            "attachment_base64": attachment_base64,
+            "attachment_name": attachment_name,
+        })
+
+    async def send_bulk(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Send POs to many vendors in parallel, one result per item in input order.
+        Each item holds the keyword arguments of send_po_to_vendor.
+        """
+        semaphore = asyncio.Semaphore(BULK_SEND_CONCURRENCY)
+        
+        async def send_one(item: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.send_po_to_vendor(**item)
         
+        results = await asyncio.gather(*(send_one(item) for item in items), return_exceptions=True)
+        return [
+            {"success": False, "error": str(result)} if isinstance(result, Exception) else result
+            for result in results
+        ]
+
+    async def send_many(self, emails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Send a burst of emails, one result per email in input order.
+        Each item holds the keyword arguments of _send_email_with_attachment;
+        over SMTP the whole burst goes out back to back on one session.
+        """
+        if self.email_provider == 'sendgrid' and self.sg:
+            return list(await asyncio.gather(
+                *(self._send_email_with_attachment(**email) for email in emails)
+            ))
+        return await self._send_smtp_batch(emails)
+
+    async def _send_smtp_batch(self, emails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Send emails back to back on one pooled SMTP session, giving up once a third have failed"""
+        results = []
+        abort_after = max(SMTP_BATCH_ABORT_MIN_FAILURES, int(len(emails) * SMTP_BATCH_ABORT_RATIO) + 1)
+        failures = 0
         try:
-            msg = MIMEMultipart()
-            msg['From'] = self.email_user
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            # Attach HTML body
-            msg.attach(MIMEText(html_body, 'html'))
-            
-            # Attach PDF if provided
-            if attachment_content and attachment_name:
-                attachment = MIMEBase('application', 'octet-stream')
-                attachment.set_payload(attachment_content)
-                encoders.encode_base64(attachment)
-                attachment.add_header(
-                    'Content-Disposition',
-                    f'attachment; filename= {attachment_name}'
-                )
-                msg.attach(attachment)
-            
-            # Send email via SMTP
-            await asyncio.to_thread(self._send_email_blocking, msg)
-            
-            logger.info(f"✅ SMTP email sent successfully to {to_email}")
-            return {"success": True, "message": f"Email sent to {to_email}"}
-            
+            async with self._smtp_pool.acquire() as session:
+                for email in emails:
+                    if failures >= abort_after:
+                        results.append({"success": False, "error": "Batch aborted after repeated SMTP failures"})
+                        continue
+                    to_email = email.get('to_email')
+                    if not to_email or not isinstance(to_email, str):
+                        logger.error("❌ Invalid to_email: %s", to_email)
+                        results.append({"success": False, "error": "Invalid email address"})
+                        continue
+                    try:
+                        # MIME assembly and serialization of a multi-MB PDF stay off the event loop
+                        message = await self._run_blocking(self._serialize_smtp_message, email)
+                        await session.sendmail(self.email_user, [to_email], message)
+                        logger.info("✅ SMTP email sent successfully to %s", to_email)
+                        results.append({"success": True, "message": f"Email sent to {to_email}"})
+                    except Exception as e:
+                        logger.error("❌ SMTP sending error for %s: %s", to_email, e)
+                        results.append({"success": False, "error": str(e)})
+                        failures += 1
+                        if failures == abort_after:
+                            logger.error("❌ Aborting SMTP batch: %d of %d sends failed", failures, len(emails))
         except Exception as e:
-            logger.error(f"❌ SMTP sending error: {e}")
-            return {"success": False, "error": str(e)}
+            # Only checkout can fail here - per-email errors are caught above
+            logger.error("❌ SMTP connection error: %s", e)
+            return [{"success": False, "error": str(e)} for _ in emails]
+        
+        return results
 
-    def _send_email_blocking(self, msg):
-        """SMTP blocking send - keep unchanged"""
-        server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-        server.starttls()
-        server.login(self.email_user, self.email_password)
-        server.send_message(msg)
-        server.quit()
-
-    # async def _send_email_with_attachment(
-    #     self, 
-    #     to_email: str, 
-    #     subject: str, 
-    #     html_body: str, 
-    #     attachment_content: bytes = None,
-    #     attachment_name: str = None
-    # ) -> Dict[str, Any]:
-    #     """Send email with optional PDF attachment"""
+    def _build_smtp_message(
+        self,
+        to_email: str,
+        subject: str,
+        html_body: str,
+        attachment_base64: str = None,
+        attachment_name: str = None
+    ) -> EmailMessage:
+        """Build the message for an SMTP send - single HTML part unless there is an attachment"""
+        msg = EmailMessage()
+        msg['From'] = self.email_user
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.set_content(html_body, subtype='html')
         
-    #     try:
-    #         msg = MIMEMultipart()
-    #         msg['From'] = self.email_user
-    #         msg['To'] = to_email
-    #         msg['Subject'] = subject
-            
-    #         # Attach HTML body
-    #         msg.attach(MIMEText(html_body, 'html'))
-            
-    #         # Attach PDF if provided
-    #         if attachment_content and attachment_name:
-    #             attachment = MIMEBase('application', 'octet-stream')
-    #             attachment.set_payload(attachment_content)
-    #             encoders.encode_base64(attachment)
-    #             attachment.add_header(
-    #                 'Content-Disposition',
-    #                 f'attachment; filename= {attachment_name}'
-    #             )
-    #             msg.attach(attachment)
-            
-    #         # Send email
-    #         await asyncio.to_thread(self._send_email_blocking, msg)
-            
-    #         logger.info(f"Email sent successfully to {to_email}")
-    #         return {"success": True, "message": f"Email sent to {to_email}"}
-            
-    #     except Exception as e:
-    #         logger.error(f"Email sending error: {e}")
-    #         return {"success": False, "error": str(e)}
-
-    # def _send_email_blocking(self, msg):
-    #     server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-    #     server.starttls()
-    #     server.login(self.email_user, self.email_password)
-    #     server.send_message(msg)
-    #     server.quit()
+        # Attach PDF if provided - payload is already base64, so no re-encoding
+        if attachment_base64 and attachment_name:
+            attachment = MIMEPart()
+            attachment['Content-Type'] = 'application/pdf'
+            attachment['Content-Transfer-Encoding'] = 'base64'
+            attachment['Content-Disposition'] = f'attachment; filename="{attachment_name}"'
+            attachment.set_payload(attachment_base64)
+            msg.make_mixed()
+            msg.attach(attachment)
+        return msg
+
+    def _serialize_smtp_message(self, email: Dict[str, Any]) -> bytes:
+        """Build a message and flatten it to wire format (CRLF line endings)"""
+        return self._build_smtp_message(**email).as_bytes(policy=SMTP_POLICY)
+
+    async def _connect_smtp(self) -> SMTP:
+        """Open and authenticate a new SMTP session"""
+        client = SMTP(hostname=self.smtp_server, port=self.smtp_port, start_tls=True)
+        await client.connect()
+        await client.login(self.email_user, self.email_password)
+        return client
+
+    async def close(self):
+        """Stop the send batcher and worker threads, and close pooled SMTP sessions and the SendGrid client"""
+        await self._smtp_batcher.close()
+        await self._smtp_pool.close()
+        if self.sg:
+            await self.sg.aclose()
+        self._executor.shutdown(wait=False)
 
 # Global instance
 email_service = EmailService()
@@ -1,6 +1,7 @@
 """
 Corporate PO PDF Generator using FPDF - Concurrent Safe & Bulletproof
 """
+import asyncio
 import io
 import os
 from typing import Dict, Any, List
@@ -312,14 +313,14 @@ class CorporatePOPDFGenerator(FPDF):
             po_number = pdf_data['po_number']
             logger.info(f"📄 Creating PDF for PO: {po_number}")
             
-            # Generate all content
-            self.generate_content(pdf_data)
+            # Generate all content (FPDF is synchronous; keep it off the event loop)
+            await asyncio.to_thread(self.generate_content, pdf_data)
             
             # Get PDF output with robust handling
             filename = f"{po_number}.pdf"
             
             try:
-                pdf_output = self.output(dest='S')
+                pdf_output = await asyncio.to_thread(self.output, dest='S')
                 
                 # Handle different output types
                 if isinstance(pdf_output, str):
@@ -1570,6 +1570,7 @@ class POWorkflowService:
                                         "vendor_email": vendor_info["vendor_email_id"],
                                         "total_amount": total_amount,
                                         "needs_approval": total_amount > approval_threshold,
+                                        "order_date": order_date,
                                         "pdf_path": pdf_result["pdf_path"],
                                         "pdf_filename": pdf_result["filename"],
                                         "materials_count": len(vendor_materials),
@@ -1864,7 +1865,8 @@ class POWorkflowService:
                     vendor_email=po["vendor_email"],
                     total_amount=po["total_amount"],
                     pdf_path=po["pdf_path"],
-                    order_numbers=po["order_numbers"],
+                    # Generated POs carry order numbers comma-joined; the email expects a list
+                    order_numbers=[n for n in po["order_numbers"].split(",") if n],
                     approver_name=finance_manager["emp_name"],
                     approver_email=finance_manager["emp_email_id"],
                     approval_token=approval_token,
@@ -1902,10 +1904,25 @@ class POWorkflowService:
         """Send PO directly to vendor"""
         
         try:
+            # Ensure order_date is a date object - the email shows N/A if it cannot be read
+            order_date = po.get("order_date")
+            if isinstance(order_date, str):
+                try:
+                    order_date = datetime.strptime(order_date, '%Y-%m-%d').date()
+                except ValueError:
+                    order_date = None
+            
             vendor_result = await email_service.send_po_to_vendor(
                 po_number=po["po_number"],
                 vendor_email=po["vendor_email"],
-                pdf_path=po["pdf_path"]
+                pdf_path=po["pdf_path"],
+                # Everything the vendor email needs is already in hand - skip the PO lookup
+                po_details={
+                    "po_number": po["po_number"],
+                    "vendor_name": po["vendor_name"],
+                    "total_amount": po["total_amount"],
+                    "order_date": order_date,
+                }
             )
             
             if vendor_result["success"]:
@@ -1951,7 +1968,7 @@ class POWorkflowService:
         
         try:
             async with db.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 
                 pos = await connection.fetch("""
                     SELECT po_number, vendor_name, total_amount, status, needs_approval,
@@ -2003,7 +2020,7 @@ class POWorkflowService:
                 # Continue with vendor notification (same as existing approve_po method)
                 async with db.pool.acquire() as connection:
                     po_details = await connection.fetchrow("""
-                        SELECT po_number, vendor_email, pdf_path, user_id, project_id, vendor_name, total_amount
+                        SELECT po_number, vendor_email, pdf_path, user_id, project_id, vendor_name, total_amount, order_date
                         FROM purchase_orders 
                         WHERE po_number = $1
                     """, po_number)
@@ -2013,7 +2030,8 @@ class POWorkflowService:
                         vendor_result = await email_service.send_po_to_vendor(
                             po_number=po_details['po_number'],
                             vendor_email=po_details['vendor_email'], 
-                            pdf_path=po_details['pdf_path']
+                            pdf_path=po_details['pdf_path'],
+                            po_details=po_details
                         )
                         
                         if vendor_result["success"]:
@@ -2104,7 +2122,7 @@ class POWorkflowService:
         """Get approval status and details for a PO"""
         try:
             async with db.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 
                 approval_details = await connection.fetchrow("""
                     SELECT ar.status, ar.approver_email, ar.comment, ar.token_expires_at,
@@ -2186,7 +2204,7 @@ class POWorkflowService:
         """Get workflow summary statistics"""
         try:
             async with db.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 
                 # Get workflow statistics
                 since_date = datetime.now() - timedelta(days=days)
@@ -2240,7 +2258,7 @@ class POWorkflowService:
         """Get count of POs pending approval for user"""
         try:
             async with db.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 
                 count = await connection.fetchval("""
                     SELECT COUNT(*)
@@ -2284,7 +2302,7 @@ class POWorkflowService:
             # Get PO details for vendor email
             async with db.pool.acquire() as connection:
                 po_details = await connection.fetchrow("""
-                    SELECT po_number, vendor_email, pdf_path, user_id, project_id, vendor_name, total_amount
+                    SELECT po_number, vendor_email, pdf_path, user_id, project_id, vendor_name, total_amount, order_date
                     FROM purchase_orders 
                     WHERE po_number = $1
                 """, po_number)
@@ -2294,7 +2312,8 @@ class POWorkflowService:
                     vendor_result = await email_service.send_po_to_vendor(
                         po_number=po_details['po_number'],
                         vendor_email=po_details['vendor_email'],
-                        pdf_path=po_details['pdf_path']
+                        pdf_path=po_details['pdf_path'],
+                        po_details=po_details
                     )
                     
                     if vendor_result["success"]:
@@ -56,7 +56,7 @@ class SQLRAGService:
         
         try:
             async with db.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 
                 # Phase 1: Retrieve from metadata embeddings (tables, columns, relationships)
                 metadata_results = await self._retrieve_metadata_embeddings(
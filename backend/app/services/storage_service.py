@@ -5,7 +5,7 @@ Storage Service using Supabase Storage with actual file operations
 import os
 import uuid
 import httpx
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any
 from fastapi import UploadFile, HTTPException
 import mimetypes
 import logging
@@ -14,6 +14,9 @@ from app.config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# 57 bytes encode to one 76-char base64 line; 1024 lines per streamed chunk
+STREAM_CHUNK_SIZE = 57 * 1024
+
 class StorageService:
     def __init__(self):
         # We'll use direct SQL queries to interact with Supabase Storage
@@ -267,6 +270,35 @@ class StorageService:
         """Download PO PDF from storage"""
         return await self.download_file(self.buckets["purchase-orders"], file_path)
     
+    async def stream_po_pdf(self, file_path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Stream PO PDF from storage in chunks without buffering the whole file"""
+        bucket_name = self.buckets["purchase-orders"]
+        try:
+            async with httpx.AsyncClient() as client:
+                download_url = f"{self.supabase_url}/storage/v1/object/{bucket_name}/{file_path}"
+                headers = {
+                    "Authorization": f"Bearer {self.supabase_service_role_key}",
+                }
+                
+                async with client.stream("GET", download_url, headers=headers, timeout=30.0) as response:
+                    if response.status_code == 404:
+                        raise HTTPException(status_code=404, detail=f"File not found: {bucket_name}/{file_path}")
+                    if response.status_code != 200:
+                        error_text = (await response.aread()).decode(errors="replace")
+                        logger.error(f"Supabase download failed: {response.status_code} - {error_text}")
+                        raise Exception(f"Download failed: {error_text}")
+                    
+                    async for chunk in response.aiter_bytes(chunk_size):
+                        yield chunk
+                
+                logger.info(f"File streamed successfully from {bucket_name}/{file_path}")
+                    
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"File stream error: {e}")
+            raise HTTPException(status_code=500, detail=f"File download failed: {str(e)}")
+    
     async def file_exists(self, bucket_name: str, file_path: str) -> bool:
         """Check if file exists in Supabase Storage bucket"""
         try:
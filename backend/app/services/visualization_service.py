@@ -1,6 +1,7 @@
 """
 AI-powered chart suggestions with visual previews and PDF export
 """
+import asyncio
 import plotly.graph_objects as go
 import plotly.express as px
 import pandas as pd
@@ -10,7 +11,7 @@ import logging
 from datetime import datetime
 from openai import AsyncOpenAI
 from app.config.settings import settings
-import base64
+import pybase64
 from io import BytesIO
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, PageBreak
@@ -614,7 +615,7 @@ class ChartService:
                 
                 # Convert to PNG bytes
                 img_bytes = fig.to_image(format="png", width=280, height=180, scale=2)
-                img_base64 = base64.b64encode(img_bytes).decode()
+                img_base64 = pybase64.b64encode(img_bytes).decode()
                 
                 thumbnails[chart_type] = f"data:image/png;base64,{img_base64}"
                 
@@ -691,7 +692,7 @@ class ChartService:
         for suggestion in suggestions:
             chart_type = suggestion['chart_type']
             svg = svg_templates.get(chart_type, svg_templates['bar'])
-            thumbnails[chart_type] = f"data:image/svg+xml;base64,{base64.b64encode(svg.encode()).decode()}"
+            thumbnails[chart_type] = f"data:image/svg+xml;base64,{pybase64.b64encode(svg.encode()).decode()}"
         
         return thumbnails
     
@@ -745,7 +746,7 @@ class ChartService:
             
             # Generate PNG for PDF
             chart_png_bytes = fig.to_image(format="png", width=1200, height=800, scale=2)
-            chart_png_base64 = base64.b64encode(chart_png_bytes).decode()
+            chart_png_base64 = pybase64.b64encode(chart_png_bytes).decode()
             
             followup_suggestions = []
             if original_query:
@@ -837,6 +838,16 @@ class ChartService:
         Generate PDF with multiple charts
         Returns PDF bytes
         """
+        # ReportLab is synchronous and CPU-bound; build in a worker thread
+        return await asyncio.to_thread(self._build_multi_chart_pdf, charts, title, user_name)
+    
+    def _build_multi_chart_pdf(
+        self,
+        charts: List[Dict[str, Any]],
+        title: str,
+        user_name: str
+    ) -> bytes:
+        """Build the multi-chart PDF synchronously"""
         
         try:
             buffer = BytesIO()
@@ -888,10 +899,11 @@ class ChartService:
                 story.append(Paragraph(chart_title_text, chart_title_style))
                 story.append(Spacer(1, 0.1*inch))
                 
-                # Chart image
-                png_base64 = chart.get('chart_png_base64')
-                if png_base64:
-                    img_data = base64.b64decode(png_base64)
+                # Chart image - prefer raw PNG bytes, fall back to base64
+                img_data = chart.get('chart_png')
+                if img_data is None and chart.get('chart_png_base64'):
+                    img_data = pybase64.b64decode(chart['chart_png_base64'])
+                if img_data:
                     img = RLImage(BytesIO(img_data), width=7*inch, height=4.5*inch)
                     story.append(img)
                 
@@ -0,0 +1,53 @@
+"""
+Small in-process caches
+"""
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    """
+    Bounded dict whose entries expire a fixed number of seconds after they
+    are set. When full, expired entries go first, then the oldest ones.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        if entry[0] <= monotonic():
+            del self._entries[key]
+            return default
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        self._entries.pop(key, None)
+        # Every entry has the same TTL, so insertion order is also expiry order
+        now = monotonic()
+        while self._entries:
+            oldest_expires_at = next(iter(self._entries.values()))[0]
+            if oldest_expires_at > now and len(self._entries) < self.max_size:
+                break
+            self._entries.popitem(last=False)
+        self._entries[key] = (now + self.ttl, value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def pop_matching(self, predicate: Callable[[Hashable], bool]):
+        """Drop every entry whose key satisfies predicate"""
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
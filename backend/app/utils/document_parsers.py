@@ -1,18 +1,24 @@
 """
 Document parsing utilities for different file formats
 """
+import asyncio
 import os
 import re
 import json
 import hashlib
+import threading
+import uuid
 from typing import List, Dict, Any, Optional
 import logging
 from io import BytesIO
 from docx import Document
-import PyPDF2
+import pypdfium2 as pdfium
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on in-flight embedding requests per document
+EMBEDDING_MAX_CONCURRENCY = 8
+
 class DocumentParser:
     """Base class for document parsers with hash-based duplicate checking"""
     
@@ -45,6 +51,32 @@ class DocumentParser:
             logger.error(f"Error checking embedding by content hash: {e}")
             return None
         
+    @staticmethod
+    async def find_embeddings_by_content_hashes(
+        connection, 
+        user_id: int, 
+        project_id: str, 
+        content_hashes: List[str], 
+        embedding_table: str
+    ) -> Dict[str, Dict[str, Any]]:
+        """Look up many content hashes in one query; returns hash -> {id, document_id}"""
+        if not content_hashes:
+            return {}
+        
+        query = f"""
+        SELECT DISTINCT ON (metadata->>'content_hash')
+               metadata->>'content_hash' AS content_hash, id, document_id::text
+        FROM {embedding_table} 
+        WHERE user_id = $1 AND project_id = $2 
+              AND metadata->>'content_hash' = ANY($3::text[])
+        """
+        try:
+            rows = await connection.fetch(query, user_id, project_id, content_hashes)
+            return {row['content_hash']: dict(row) for row in rows}
+        except Exception as e:
+            logger.error(f"Error checking embeddings by content hashes: {e}")
+            return {}
+
     @staticmethod
     async def check_existing_metadata_embedding(
         connection, 
@@ -993,8 +1025,12 @@ class ReferenceParser(DocumentParser):
         get_embedding_func
     ) -> Dict[str, int]:
         """Create reference embeddings with smart deduplication"""
-        stats = {"inserted": 0, "updated": 0, "skipped": 0, "reused": 0, "relinked": 0}
+        stats = {"inserted": 0, "updated": 0, "skipped": 0, "reused": 0, "copied": 0}
+        this_document = uuid.UUID(str(document_id))
+        pending = []  # (chunk_idx, chunk_text, content_hash, existing_for_document)
+        pending_hashes = set()
         
+        # Pass 1: dedup checks on the shared connection (queries must run sequentially)
         for chunk_idx, chunk_text in enumerate(chunks):
             if not chunk_text.strip():
                 continue
@@ -1002,21 +1038,25 @@ class ReferenceParser(DocumentParser):
             try:
                 content_hash = cls.generate_content_hash(chunk_text)
                 
+                # Same content earlier in this document - it will be stored once
+                if content_hash in pending_hashes:
+                    stats["reused"] += 1
+                    continue
+                
                 # Check if this exact content already exists
                 existing_by_hash = await cls.check_embedding_by_content_hash(
                     connection, user_id, project_id, content_hash, "reference_embeddings"
                 )
                 
                 if existing_by_hash:
-                    # Case A: Content exists but belongs to a different document - RELINK
-                    if existing_by_hash.get("document_id") != document_id:
-                        await cls._update_reference_document_id(
-                            connection,
-                            existing_by_hash["id"],
-                            document_id
+                    # Case A: Content exists but belongs to a different document - COPY,
+                    # that document keeps its chunk
+                    if uuid.UUID(str(existing_by_hash["document_id"])) != this_document:
+                        await cls.copy_reference_embeddings(
+                            connection, [existing_by_hash["id"]], [chunk_idx], document_id
                         )
-                        stats["relinked"] += 1
-                        logger.info(f"Relinked existing embedding (chunk {chunk_idx}) to new document ID {document_id}")
+                        stats["copied"] += 1
+                        logger.info(f"Copied existing embedding (chunk {chunk_idx}) into document ID {document_id}")
                     else:
                         # Case B: Content exists and already belongs to this document - REUSE
                         stats["reused"] += 1
@@ -1027,9 +1067,30 @@ class ReferenceParser(DocumentParser):
                 existing_for_document = await cls._check_existing_reference_embedding(
                     connection, user_id, project_id, chunk_idx
                 )
-                
-                # Generate embedding only when needed (not found by hash)
-                new_embedding = await get_embedding_func(chunk_text)
+                pending.append((chunk_idx, chunk_text, content_hash, existing_for_document))
+                pending_hashes.add(content_hash)
+                    
+            except Exception as e:
+                logger.error(f"Error processing reference chunk {chunk_idx}: {e}")
+                continue
+        
+        # Pass 2: generate embeddings only when needed (not found by hash), concurrently
+        semaphore = asyncio.Semaphore(EMBEDDING_MAX_CONCURRENCY)
+        
+        async def bounded_embedding(chunk_text: str):
+            async with semaphore:
+                return await get_embedding_func(chunk_text)
+        
+        embeddings = await asyncio.gather(
+            *(bounded_embedding(chunk_text) for _, chunk_text, _, _ in pending),
+            return_exceptions=True
+        )
+        
+        # Pass 3: write results back in chunk order
+        for (chunk_idx, chunk_text, content_hash, existing_for_document), new_embedding in zip(pending, embeddings):
+            try:
+                if isinstance(new_embedding, Exception):
+                    raise new_embedding
                 
                 metadata = {
                     "chunk_index": chunk_idx,
@@ -1079,6 +1140,26 @@ class ReferenceParser(DocumentParser):
             logger.error(f"Error checking existing reference embedding: {e}")
             return None
 
+    @staticmethod
+    async def find_reference_chunk_positions(
+        connection, user_id: int, project_id: str, chunk_indexes: List[int]
+    ) -> set:
+        """Batched _check_existing_reference_embedding: which of these chunk positions already hold an embedding"""
+        if not chunk_indexes:
+            return set()
+
+        query = """
+        SELECT DISTINCT chunk_index
+        FROM reference_embeddings
+        WHERE user_id = $1 AND project_id = $2 AND chunk_index = ANY($3::int[])
+        """
+        try:
+            rows = await connection.fetch(query, user_id, project_id, chunk_indexes)
+            return {row['chunk_index'] for row in rows}
+        except Exception as e:
+            logger.error(f"Error checking existing reference chunk positions: {e}")
+            return set()
+
     @staticmethod
     async def _insert_reference_embedding(
         connection, document_id: str, user_id: int, project_id: str,
@@ -1117,14 +1198,23 @@ class ReferenceParser(DocumentParser):
             document_id, user_id, project_id, chunk_index
         )
     @staticmethod
-    async def _update_reference_document_id(connection, row_id: str, new_document_id: str):
-        """Update the document_id for an existing embedding record - RELINK operation"""
+    async def copy_reference_embeddings(
+        connection, row_ids: List[Any], chunk_indexes: List[int], new_document_id: str
+    ):
+        """
+        Copy existing embedding records into a new document in one statement,
+        row_ids[i] becoming chunk chunk_indexes[i]. The source documents keep their rows.
+        """
         query = """
-        UPDATE reference_embeddings
-        SET document_id = $1, created_at = CURRENT_TIMESTAMP
-        WHERE id = $2
+        INSERT INTO reference_embeddings
+        (document_id, project_id, user_id, chunk_index, content, embedding, metadata)
+        SELECT $1, src.project_id, src.user_id, c.chunk_index, src.content, src.embedding,
+               jsonb_set(src.metadata, '{chunk_index}', to_jsonb(c.chunk_index))
+        FROM unnest($2::uuid[], $3::int[]) AS c(id, chunk_index)
+        JOIN reference_embeddings src ON src.id = c.id
+        ON CONFLICT (document_id, user_id, project_id, chunk_index) DO NOTHING
         """
-        await connection.execute(query, new_document_id, row_id)
+        await connection.execute(query, new_document_id, row_ids, chunk_indexes)
 
     @classmethod
     async def batch_insert_reference_embeddings(
@@ -1160,9 +1250,44 @@ class ReferenceParser(DocumentParser):
                 json.dumps(emb['metadata'])
             ))
         
-        await connection.executemany(insert_query, batch_values)
+        try:
+            await cls._copy_reference_embeddings(connection, batch_values)
+        except Exception as e:
+            logger.warning(f"COPY of reference embeddings failed, falling back to executemany: {e}")
+            await connection.executemany(insert_query, batch_values)
         return len(batch_values)
 
+    @staticmethod
+    async def _copy_reference_embeddings(connection, batch_values: List[tuple]):
+        """Bulk load embeddings with COPY into a staging table, then upsert in one statement"""
+        columns = ['document_id', 'project_id', 'user_id', 'chunk_index', 'content', 'embedding', 'metadata']
+        
+        async with connection.transaction():
+            await connection.execute("""
+            CREATE TEMP TABLE reference_embeddings_staging
+            (LIKE reference_embeddings INCLUDING DEFAULTS) ON COMMIT DROP
+            """)
+            await connection.copy_records_to_table(
+                'reference_embeddings_staging', records=batch_values, columns=columns
+            )
+            await connection.execute("""
+            INSERT INTO reference_embeddings 
+            (document_id, project_id, user_id, chunk_index, content, embedding, metadata)
+            SELECT document_id, project_id, user_id, chunk_index, content, embedding, metadata
+            FROM reference_embeddings_staging
+            ON CONFLICT (document_id, user_id, project_id, chunk_index) 
+            DO UPDATE SET 
+                content = EXCLUDED.content,
+                embedding = EXCLUDED.embedding,
+                metadata = EXCLUDED.metadata,
+                created_at = CURRENT_TIMESTAMP
+            """)
+            await connection.execute("DROP TABLE reference_embeddings_staging")
+
+# PDFium is not thread-safe, even across separate documents - every call into it goes through this lock
+_PDFIUM_LOCK = threading.Lock()
+
+
 class FileExtractor:
     """Extract text from different file formats"""
     
@@ -1172,10 +1297,11 @@ class FileExtractor:
         file_extension = os.path.splitext(file_path)[1].lower()
         
         try:
+            # PDF/DOCX parsing is CPU-bound; keep it off the event loop
             if file_extension == '.pdf':
-                return FileExtractor._extract_pdf_text(file_content)
+                return await asyncio.to_thread(FileExtractor._extract_pdf_text, file_content)
             elif file_extension in ['.docx', '.doc']:
-                return FileExtractor._extract_docx_text(file_content)
+                return await asyncio.to_thread(FileExtractor._extract_docx_text, file_content)
             elif file_extension in ['.txt', '.json']:
                 return file_content.decode('utf-8')
             else:
@@ -1186,12 +1312,23 @@ class FileExtractor:
     
     @staticmethod
     def _extract_pdf_text(file_content: bytes) -> str:
-        """Extract text from PDF"""
-        pdf_reader = PyPDF2.PdfReader(BytesIO(file_content))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        """Extract text from PDF (serialized - see _PDFIUM_LOCK)"""
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(file_content)
+            try:
+                page_texts = []
+                for page in pdf:
+                    try:
+                        textpage = page.get_textpage()
+                        try:
+                            page_texts.append(textpage.get_text_range() + "\n")
+                        finally:
+                            textpage.close()
+                    finally:
+                        page.close()
+                return "".join(page_texts)
+            finally:
+                pdf.close()
     
     @staticmethod
     def _extract_docx_text(file_content: bytes) -> str:
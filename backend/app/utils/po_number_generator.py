@@ -61,7 +61,7 @@ class PONumberGenerator:
             
             # Get count from database
             async with db.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 
                 count = await connection.fetchval("""
                     SELECT COUNT(*) FROM purchase_orders 
@@ -82,7 +82,7 @@ class PONumberGenerator:
         
         try:
             async with db.pool.acquire() as connection:
-                await connection.execute(f"SET LOCAL app.current_user_id = {user_id}")
+                await connection.execute("SELECT set_config('app.current_user_id', $1, true)", str(user_id))
                 
                 # Check if PO number exists
                 exists = await connection.fetchval("""
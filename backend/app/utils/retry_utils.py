@@ -0,0 +1,22 @@
+"""
+Backoff helpers shared by the outbound HTTP API clients
+"""
+import random
+from typing import Optional
+import httpx
+
+
+def retry_delay(response: Optional[httpx.Response], attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """
+    Seconds to wait before retrying a failed call. Honours the server's
+    Retry-After header when the response has one, otherwise exponential
+    backoff with jitter. Never more than cap.
+    """
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), cap)
+            except ValueError:
+                pass
+    return min(base * (2 ** attempt + random.random()), cap)
@@ -3,7 +3,7 @@ WebSocket connection manager for real-time PO workflow notifications
 """
 from fastapi import WebSocket, WebSocketDisconnect
 from typing import Dict, List
-import json
+import orjson
 import logging
 from datetime import datetime
 
@@ -55,10 +55,12 @@ class ConnectionManager:
     async def broadcast_to_project(self, project_id: str, message: Dict):
         """Broadcast message to all connections in a project"""
         if project_id in self.active_connections:
+            # Serialize once and send the same payload to every subscriber
+            payload = orjson.dumps(message).decode()
             disconnected = []
             for connection in self.active_connections[project_id]:
                 try:
-                    await connection.send_text(json.dumps(message))
+                    await connection.send_text(payload)
                 except WebSocketDisconnect:
                     disconnected.append(connection)
                 except Exception as e: